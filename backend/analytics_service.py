@@ -5,14 +5,21 @@ State-of-art features: forecasting, anomaly detection, trend analysis, and visua
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, case
+from sqlalchemy import func, and_, or_, case, select, bindparam, event, cast, Float
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from decimal import Decimal
 import json
+import logging
+import time
+import functools
+import threading
 import numpy as np
 from collections import defaultdict
-from statistics import mean, stdev
+from itertools import islice
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import pandas as pd
@@ -30,8 +37,388 @@ except ImportError:
 from database.saas_models_py37 import (
     Product, ProductRevision, BOMCurrent, InventoryBalance, InventoryTransaction,
     Shipment, ShipmentLine, ProductChangeEvent, ShipmentEvent,
-    ProductStatus, TransactionType, ShipmentStatus
+    InventoryKpiSummary, InventoryStatusSummary, InventoryLocationSummary, KpiCounter,
+    ProductStatus, TransactionType, ShipmentStatus, LOW_STOCK_THRESHOLD, OUTBOUND_TRANSACTION_TYPES,
+    listen_bulk_insert
 )
+from backend.database import get_db_context
+
+logger = logging.getLogger(__name__)
+
+# Cumulative value percentage upper bounds for the A and B classes
+ABC_A_THRESHOLD = 70
+ABC_B_THRESHOLD = 90
+
+
+# ============================================================================
+# Precompiled Statements
+# ============================================================================
+# Core statements with bound parameters share one cache key, so SQLAlchemy's
+# compiled cache reuses the SQL string across calls. Each is built on first
+# use rather than at import, so a statement naming a column the mapped model
+# lacks fails in its own endpoint instead of breaking the module import.
+
+@functools.lru_cache(maxsize=None)
+def _shipment_kpi_stmt():
+    """
+    All shipment KPIs in one grouped pass: period counts, on-time deliveries and
+    all-time fulfillment totals per status (fulfillment_days is NULL until shipped)
+    """
+    in_period = Shipment.created_at >= bindparam('cutoff')
+    return select(
+        Shipment.status,
+        func.count(Shipment.id).label('total'),
+        func.count(case((in_period, 1))).label('period_count'),
+        func.count(case((Shipment.actual_ship_date <= Shipment.scheduled_ship_date, 1))).label('on_time'),
+        func.sum(Shipment.fulfillment_days).label('fulfillment_days'),
+        func.count(Shipment.fulfillment_days).label('fulfilled')
+    ).group_by(Shipment.status)
+
+
+@functools.lru_cache(maxsize=None)
+def _inventory_trends_stmt():
+    return select(
+        func.date(InventoryTransaction.created_at).label('date'),
+        InventoryTransaction.transaction_type,
+        cast(func.sum(InventoryTransaction.quantity), Float).label('total_quantity'),
+        func.count(InventoryTransaction.id).label('transaction_count')
+    ).where(
+        InventoryTransaction.created_at >= bindparam('cutoff')
+    ).group_by(
+        func.date(InventoryTransaction.created_at),
+        InventoryTransaction.transaction_type
+    ).order_by(func.date(InventoryTransaction.created_at))
+
+
+@functools.lru_cache(maxsize=None)
+def _shipment_trends_stmt():
+    return select(
+        func.date(Shipment.created_at).label('date'),
+        Shipment.status,
+        func.count(Shipment.id).label('count')
+    ).where(
+        Shipment.created_at >= bindparam('cutoff')
+    ).group_by(
+        func.date(Shipment.created_at),
+        Shipment.status
+    ).order_by(func.date(Shipment.created_at))
+
+
+@functools.lru_cache(maxsize=None)
+def _daily_inbound_outbound_stmt():
+    return select(
+        func.date(InventoryTransaction.created_at).label('date'),
+        cast(func.sum(
+            case(
+                (InventoryTransaction.transaction_type == TransactionType.RECEIPT, InventoryTransaction.quantity),
+                else_=0
+            )
+        ), Float).label('inbound'),
+        cast(func.sum(
+            case(
+                (InventoryTransaction.transaction_type.in_(OUTBOUND_TRANSACTION_TYPES), InventoryTransaction.quantity),
+                else_=0
+            )
+        ), Float).label('outbound')
+    ).where(
+        InventoryTransaction.created_at >= bindparam('cutoff')
+    ).group_by(
+        func.date(InventoryTransaction.created_at)
+    ).order_by('date')
+
+
+# ============================================================================
+# Result Cache
+# ============================================================================
+# Slow-moving analytics are cached in-process for a short TTL. Any write to the
+# underlying tables in this process bumps _data_version, which changes the
+# cache key; the TTL bounds staleness from writes made by other workers.
+
+ANALYTICS_CACHE_TTL_SECONDS = 30
+DASHBOARD_CACHE_TTL_SECONDS = 120
+ANALYTICS_CACHE_MAX_ENTRIES = 64
+
+_data_version = 0
+_result_cache = {}
+_cache_lock = threading.RLock()
+
+
+def invalidate_analytics_cache():
+    """Drop every cached analytics result in this process"""
+    global _data_version
+    with _cache_lock:
+        _data_version += 1
+        _result_cache.clear()
+
+
+def _bump_data_version(mapper, connection, target):
+    global _data_version
+    _data_version += 1
+
+
+def _bump_data_version_bulk(connection, rows):
+    global _data_version
+    _data_version += 1
+
+
+for _model in (Product, ProductRevision, BOMCurrent, InventoryBalance,
+               InventoryTransaction, Shipment, ShipmentLine):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _bump_data_version)
+    listen_bulk_insert(_model, _bump_data_version_bulk)
+
+
+def cached_result(func=None, ttl: int = ANALYTICS_CACHE_TTL_SECONDS):
+    """
+    Cache an analytics method's result per (arguments, data version) for the TTL
+    Usable bare (@cached_result) or with a TTL (@cached_result(ttl=...))
+    """
+    if func is None:
+        return functools.partial(cached_result, ttl=ttl)
+    
+    @functools.wraps(func)
+    def wrapper(db, *args, **kwargs):
+        key = (func.__name__, args, tuple(sorted(kwargs.items())), _data_version)
+        now = time.monotonic()
+        
+        with _cache_lock:
+            entry = _result_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        
+        result = func(db, *args, **kwargs)
+        
+        with _cache_lock:
+            if len(_result_cache) >= ANALYTICS_CACHE_MAX_ENTRIES:
+                for stale in [k for k, (expires_at, _) in _result_cache.items() if expires_at <= now]:
+                    _result_cache.pop(stale, None)
+                while len(_result_cache) >= ANALYTICS_CACHE_MAX_ENTRIES:
+                    _result_cache.pop(next(iter(_result_cache)), None)
+            _result_cache[key] = (now + ttl, result)
+        
+        return result
+    return wrapper
+
+
+# ============================================================================
+# Dashboard Workers
+# ============================================================================
+# The dashboard's sub-analytics are independent read-only aggregations; they
+# run concurrently, each on its own pooled session.
+
+DASHBOARD_WORKERS = 8
+
+_dashboard_executor = ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix='dashboard')
+
+
+def _run_in_session(analytic):
+    """Run one analytic on a short-lived session of its own"""
+    with get_db_context() as db:
+        return analytic(db)
+
+
+# ============================================================================
+# Columnar Result Sets
+# ============================================================================
+# Analytics results are held as NumPy columns; per-row dicts are only built
+# by to_records() when a result is returned through the API. List endpoints
+# can skip the dicts entirely with to_json(), which serializes through pandas.
+
+
+def _records_json(columns: Dict[str, np.ndarray]) -> str:
+    """Serialize named columns as a JSON array of records"""
+    if HAS_PANDAS:
+        return pd.DataFrame(columns).to_json(orient='records')
+    names = list(columns)
+    return json.dumps([
+        dict(zip(names, values))
+        for values in zip(*(column.tolist() for column in columns.values()))
+    ])
+
+
+@dataclass
+class AbcResult:
+    """ABC classification, one entry per product, ordered by value"""
+    ids: np.ndarray
+    codes: np.ndarray
+    names: np.ndarray
+    qty: np.ndarray
+    cum_pct: np.ndarray
+    klass: np.ndarray
+    total_value: float
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def to_records(self, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        columns = (self.ids, self.codes, self.names, self.qty, self.cum_pct)
+        if mask is not None:
+            columns = tuple(column[mask] for column in columns)
+        return [
+            {
+                'product_id': product_id,
+                'product_code': code,
+                'name': name,
+                'quantity': qty,
+                'cumulative_pct': pct
+            }
+            for product_id, code, name, qty, pct in zip(*(column.tolist() for column in columns))
+        ]
+
+
+@dataclass
+class BomComplexityResult:
+    """BOM complexity per parent product, ordered by component count"""
+    ids: np.ndarray
+    codes: np.ndarray
+    names: np.ndarray
+    component_counts: np.ndarray
+    total_quantities: np.ndarray
+    
+    def to_records(self) -> List[Dict]:
+        return [
+            {
+                'product_id': product_id,
+                'product_code': code,
+                'name': name,
+                'unique_components': components,
+                'total_parts_needed': total
+            }
+            for product_id, code, name, components, total in zip(
+                self.ids.tolist(), self.codes.tolist(), self.names.tolist(),
+                self.component_counts.tolist(), self.total_quantities.tolist()
+            )
+        ]
+    
+    def to_json(self) -> str:
+        return _records_json({
+            'product_id': self.ids,
+            'product_code': self.codes,
+            'name': self.names,
+            'unique_components': self.component_counts,
+            'total_parts_needed': self.total_quantities
+        })
+
+
+@dataclass
+class LocationUtilizationResult:
+    """Inventory utilization per location"""
+    codes: np.ndarray
+    product_counts: np.ndarray
+    on_hand: np.ndarray
+    reserved: np.ndarray
+    utilization_rate: np.ndarray
+    
+    def to_records(self) -> List[Dict]:
+        return [
+            {
+                'location_code': location,
+                'product_count': product_count,
+                'total_on_hand': on_hand,
+                'total_reserved': reserved,
+                'total_available': available,
+                'utilization_rate': rate
+            }
+            for location, product_count, on_hand, reserved, available, rate in zip(
+                self.codes.tolist(), self.product_counts.tolist(), self.on_hand.tolist(),
+                self.reserved.tolist(), (self.on_hand - self.reserved).tolist(), self.utilization_rate.tolist()
+            )
+        ]
+    
+    def to_json(self) -> str:
+        return _records_json({
+            'location_code': self.codes,
+            'product_count': self.product_counts,
+            'total_on_hand': self.on_hand,
+            'total_reserved': self.reserved,
+            'total_available': self.on_hand - self.reserved,
+            'utilization_rate': self.utilization_rate
+        })
+
+
+@dataclass
+class DemandSupplyResult:
+    """Stock cover and forecast status per product"""
+    codes: np.ndarray
+    inventory: np.ndarray
+    daily_demand: np.ndarray
+    days_of_stock: np.ndarray
+    status: np.ndarray
+    days: int
+    
+    @property
+    def at_risk(self) -> np.ndarray:
+        return (self.status == 'critical_stockout_risk') | (self.status == 'overstock')
+    
+    def to_records(self, mask: Optional[np.ndarray] = None) -> List[Dict]:
+        columns = (self.codes, self.inventory, np.round(self.daily_demand, 2),
+                   np.round(self.days_of_stock, 1), self.status)
+        if mask is not None:
+            columns = tuple(column[mask] for column in columns)
+        return [
+            {
+                'product_code': code,
+                'current_inventory': inventory,
+                'daily_avg_demand': daily_demand,
+                'estimated_days_of_stock': days_of_stock,
+                'forecast_status': forecast_status
+            }
+            for code, inventory, daily_demand, days_of_stock, forecast_status in zip(
+                *(column.tolist() for column in columns)
+            )
+        ]
+
+
+def _column(rows, index: int, dtype=object) -> np.ndarray:
+    """Extract one column of a result set as an ndarray"""
+    if dtype is object:
+        return np.array([row[index] for row in rows], dtype=object)
+    return np.fromiter((row[index] or 0 for row in rows), dtype=dtype, count=len(rows))
+
+
+STREAM_CHUNK_SIZE = 5000
+
+
+def _stream_columns(query, dtypes) -> List[np.ndarray]:
+    """
+    Stream a query through a server-side cursor into one ndarray per column
+    Only STREAM_CHUNK_SIZE rows are held as Python objects at a time
+    """
+    rows = iter(query.execution_options(stream_results=True).yield_per(STREAM_CHUNK_SIZE))
+    chunks = [[] for _ in dtypes]
+    
+    while True:
+        batch = list(islice(rows, STREAM_CHUNK_SIZE))
+        if not batch:
+            break
+        for index, dtype in enumerate(dtypes):
+            chunks[index].append(_column(batch, index, dtype))
+    
+    return [
+        np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+        for chunk, dtype in zip(chunks, dtypes)
+    ]
+
+
+def _product_labels(db: Session, ids: np.ndarray):
+    """
+    Look up product_code and name for an id column, aligned to its order
+    Keeps the heavy aggregations narrow; labels are fetched by primary key
+    """
+    id_list = ids.tolist()
+    labels = {}
+    for start in range(0, len(id_list), STREAM_CHUNK_SIZE):
+        labels.update(
+            (row.id, (row.product_code, row.name))
+            for row in db.query(Product.id, Product.product_code, Product.name).filter(
+                Product.id.in_(id_list[start:start + STREAM_CHUNK_SIZE])
+            )
+        )
+    
+    missing = (None, None)
+    codes = np.array([labels.get(product_id, missing)[0] for product_id in id_list], dtype=object)
+    names = np.array([labels.get(product_id, missing)[1] for product_id in id_list], dtype=object)
+    return codes, names
 
 
 class AnalyticsService:
@@ -45,38 +432,119 @@ class AnalyticsService:
     def get_inventory_kpis(db: Session) -> Dict:
         """Calculate inventory key performance indicators"""
         
-        # Total inventory value (simplified - assumes cost = 1 per unit)
-        total_on_hand = db.query(func.sum(InventoryBalance.quantity_on_hand)).scalar() or 0
-        total_reserved = db.query(func.sum(InventoryBalance.quantity_reserved)).scalar() or 0
+        # Served from the incrementally maintained roll-up tables, which
+        # seed_rollups fills at startup; until then, aggregate the balances live
+        summary = db.query(InventoryKpiSummary).filter(InventoryKpiSummary.id == 1).first()
+        if summary is None:
+            summary, status_totals, _ = AnalyticsService._aggregate_inventory(db)
+            inventory_by_status = [(status, float(total or 0)) for status, total in status_totals]
+        else:
+            inventory_by_status = db.query(
+                InventoryStatusSummary.status,
+                cast(InventoryStatusSummary.total_on_hand, Float)
+            ).all()
+        
+        total_on_hand = summary.total_on_hand or 0
+        total_reserved = summary.total_reserved or 0
+        
+        return {
+            'total_units_on_hand': float(total_on_hand),
+            'total_units_reserved': float(total_reserved),
+            'total_units_available': float(total_on_hand - total_reserved),
+            'inventory_by_status': dict(inventory_by_status),
+            'low_stock_items': summary.low_stock_count,
+            'zero_stock_items': summary.zero_stock_count,
+            'active_locations': summary.active_locations
+        }
+    
+    @staticmethod
+    def seed_rollups(db: Session) -> None:
+        """
+        Build the roll-up tables and KPI counters when they are empty
+        Called once at startup; writes keep them current afterwards
+        """
+        try:
+            if db.query(InventoryKpiSummary.id).filter(InventoryKpiSummary.id == 1).first() is None:
+                AnalyticsService.refresh_inventory_kpi_summary(db)
+            if db.query(KpiCounter.name).first() is None:
+                AnalyticsService.refresh_kpi_counters(db)
+        except IntegrityError:
+            # Another worker seeded them first
+            db.rollback()
+        except (OperationalError, ProgrammingError):
+            # Roll-up tables not migrated yet, or the database is unreachable;
+            # the KPI endpoints aggregate live until a later start seeds them
+            db.rollback()
+            logger.warning("Skipping roll-up seeding", exc_info=True)
+    
+    @staticmethod
+    def _aggregate_inventory(db: Session) -> Tuple[InventoryKpiSummary, List, List]:
+        """
+        Compute the inventory roll-ups straight from InventoryBalance
+        Returns an unsaved summary row, (status, total) rows and per-location rows
+        """
+        
+        # Totals plus low-stock (available < threshold) and zero-stock counts in one pass
+        total_on_hand, total_reserved, low_stock_count, zero_stock_count = db.query(
+            func.coalesce(func.sum(InventoryBalance.quantity_on_hand), 0),
+            func.coalesce(func.sum(InventoryBalance.quantity_reserved), 0),
+            func.count(case((
+                InventoryBalance.quantity_on_hand - InventoryBalance.quantity_reserved < LOW_STOCK_THRESHOLD, 1
+            ))),
+            func.count(case((InventoryBalance.quantity_on_hand == 0, 1)))
+        ).one()
         
-        # Inventory by status
         inventory_by_status = db.query(
             Product.status,
             func.sum(InventoryBalance.quantity_on_hand).label('total')
         ).join(InventoryBalance).group_by(Product.status).all()
         
-        # Products with low stock (available < 10)
-        low_stock_count = db.query(InventoryBalance).filter(
-            InventoryBalance.quantity_on_hand - InventoryBalance.quantity_reserved < 10
-        ).count()
-        
-        # Products with zero stock
-        zero_stock_count = db.query(InventoryBalance).filter(
-            InventoryBalance.quantity_on_hand == 0
-        ).count()
+        location_stats = db.query(
+            InventoryBalance.location_code,
+            func.count(func.distinct(InventoryBalance.product_id)),
+            func.sum(InventoryBalance.quantity_on_hand),
+            func.sum(InventoryBalance.quantity_reserved)
+        ).group_by(InventoryBalance.location_code).all()
         
-        # Stock locations
-        total_locations = db.query(func.count(func.distinct(InventoryBalance.location_code))).scalar()
+        summary = InventoryKpiSummary(
+            id=1,
+            total_on_hand=total_on_hand,
+            total_reserved=total_reserved,
+            low_stock_count=low_stock_count,
+            zero_stock_count=zero_stock_count,
+            active_locations=len(location_stats)
+        )
+        return summary, inventory_by_status, location_stats
+    
+    @staticmethod
+    def refresh_inventory_kpi_summary(db: Session) -> InventoryKpiSummary:
+        """
+        Rebuild the inventory KPI roll-up tables from InventoryBalance
+        Run once to seed the tables; balance writes keep them current afterwards
+        """
+        summary, inventory_by_status, location_stats = AnalyticsService._aggregate_inventory(db)
+        
+        db.query(InventoryKpiSummary).delete()
+        db.query(InventoryStatusSummary).delete()
+        db.query(InventoryLocationSummary).delete()
+        
+        db.add(summary)
+        db.add_all([
+            InventoryStatusSummary(status=status, total_on_hand=total or 0)
+            for status, total in inventory_by_status
+        ])
+        db.add_all([
+            InventoryLocationSummary(
+                location_code=location,
+                product_count=product_count,
+                total_on_hand=on_hand or 0,
+                total_reserved=reserved or 0
+            )
+            for location, product_count, on_hand, reserved in location_stats
+        ])
         
-        return {
-            'total_units_on_hand': float(total_on_hand),
-            'total_units_reserved': float(total_reserved),
-            'total_units_available': float(total_on_hand - total_reserved),
-            'inventory_by_status': {status: float(total) for status, total in inventory_by_status},
-            'low_stock_items': low_stock_count,
-            'zero_stock_items': zero_stock_count,
-            'active_locations': total_locations
-        }
+        db.commit()
+        return summary
     
     @staticmethod
     def get_shipment_kpis(db: Session, days: int = 30) -> Dict:
@@ -84,67 +552,74 @@ class AnalyticsService:
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        # Shipments by status
-        shipments_by_status = db.query(
-            Shipment.status,
-            func.count(Shipment.id).label('count')
-        ).filter(Shipment.created_at >= cutoff_date).group_by(Shipment.status).all()
-        
-        # On-time delivery (simplified - planned vs actual)
-        on_time = db.query(Shipment).filter(
-            and_(
-                Shipment.status == ShipmentStatus.DELIVERED,
-                Shipment.actual_delivery_date <= Shipment.estimated_delivery_date
-            )
-        ).count()
-        
-        total_delivered = db.query(Shipment).filter(
-            Shipment.status == ShipmentStatus.DELIVERED
-        ).count()
+        # One round-trip; the per-status rows are folded in Python
+        status_stats = db.execute(_shipment_kpi_stmt(), {'cutoff': cutoff_date}).all()
+        
+        shipments_by_status = {}
+        on_time = total_delivered = fulfilled = 0
+        fulfillment_total = 0.0
+        for shipment_status, total, period_count, status_on_time, fulfillment_days, status_fulfilled in status_stats:
+            if period_count:
+                shipments_by_status[shipment_status] = period_count
+            # On-time delivery (simplified - planned vs actual)
+            if shipment_status == ShipmentStatus.DELIVERED:
+                on_time = status_on_time
+                total_delivered = total
+            fulfilled += status_fulfilled
+            fulfillment_total += fulfillment_days or 0
         
         on_time_rate = (on_time / total_delivered * 100) if total_delivered > 0 else 0
         
-        # Average fulfillment time
-        avg_fulfillment = db.query(
-            func.avg(
-                func.julianday(Shipment.actual_ship_date) - func.julianday(Shipment.created_at)
-            )
-        ).filter(Shipment.actual_ship_date.isnot(None)).scalar()
+        # Average fulfillment time across all shipped shipments
+        avg_fulfillment = fulfillment_total / fulfilled if fulfilled else 0
         
         return {
-            'shipments_by_status': {status: count for status, count in shipments_by_status},
+            'shipments_by_status': shipments_by_status,
             'on_time_delivery_rate': round(on_time_rate, 2),
-            'avg_fulfillment_days': round(float(avg_fulfillment or 0), 2),
+            'avg_fulfillment_days': round(avg_fulfillment or 0, 2),
             'total_delivered': total_delivered,
             'reporting_period_days': days
         }
     
     @staticmethod
+    @cached_result
     def get_plm_kpis(db: Session) -> Dict:
         """Calculate PLM key performance indicators"""
         
-        # Products by status
-        products_by_status = db.query(
+        # Revision count per product and the set of products that have a BOM
+        revision_counts = db.query(
+            ProductRevision.product_id.label('product_id'),
+            func.count(ProductRevision.id).label('revision_count')
+        ).group_by(ProductRevision.product_id).subquery()
+        
+        # A BOM hangs off a revision, so its parent product comes from the revision
+        bom_parents = db.query(
+            ProductRevision.product_id.label('product_id')
+        ).join(
+            BOMCurrent, BOMCurrent.product_revision_id == ProductRevision.id
+        ).distinct().subquery()
+        
+        # Everything per status in one pass; totals are summed in Python
+        status_stats = db.query(
             Product.status,
-            func.count(Product.id).label('count')
+            func.count(Product.id),
+            func.count(revision_counts.c.product_id),
+            func.coalesce(func.sum(revision_counts.c.revision_count), 0),
+            func.count(bom_parents.c.product_id)
+        ).outerjoin(
+            revision_counts, revision_counts.c.product_id == Product.id
+        ).outerjoin(
+            bom_parents, bom_parents.c.product_id == Product.id
         ).group_by(Product.status).all()
         
-        # Products with revisions
-        products_with_revisions = db.query(func.count(func.distinct(ProductRevision.product_id))).scalar()
-        total_products = db.query(func.count(Product.id)).scalar()
-        
-        # Average revisions per product
-        avg_revisions = db.query(
-            func.avg(
-                db.query(func.count(ProductRevision.id))
-                .filter(ProductRevision.product_id == Product.id)
-                .correlate(Product)
-                .scalar_subquery()
-            )
-        ).scalar()
+        products_by_status = [(product_status, count) for product_status, count, _, _, _ in status_stats]
+        total_products = sum(count for _, count, _, _, _ in status_stats)
+        products_with_revisions = sum(with_revisions for _, _, with_revisions, _, _ in status_stats)
+        total_revisions = sum(int(revisions) for _, _, _, revisions, _ in status_stats)
+        products_with_bom = sum(with_bom for _, _, _, _, with_bom in status_stats)
         
-        # Products with BOM
-        products_with_bom = db.query(func.count(func.distinct(BOMCurrent.parent_product_id))).scalar()
+        # Average revisions across products that have any
+        avg_revisions = total_revisions / products_with_revisions if products_with_revisions else 0
         
         return {
             'total_products': total_products,
@@ -167,23 +642,13 @@ class AnalyticsService:
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
         # Daily transaction summary
-        trends = db.query(
-            func.date(InventoryTransaction.created_at).label('date'),
-            InventoryTransaction.transaction_type,
-            func.sum(InventoryTransaction.quantity).label('total_quantity'),
-            func.count(InventoryTransaction.id).label('transaction_count')
-        ).filter(
-            InventoryTransaction.created_at >= cutoff_date
-        ).group_by(
-            func.date(InventoryTransaction.created_at),
-            InventoryTransaction.transaction_type
-        ).order_by(func.date(InventoryTransaction.created_at)).all()
+        trends = db.execute(_inventory_trends_stmt(), {'cutoff': cutoff_date}).all()
         
         return [
             {
                 'date': str(date),
                 'transaction_type': txn_type.value,
-                'total_quantity': float(total),
+                'total_quantity': total,
                 'count': count
             }
             for date, txn_type, total, count in trends
@@ -195,16 +660,7 @@ class AnalyticsService:
         
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        trends = db.query(
-            func.date(Shipment.created_at).label('date'),
-            Shipment.status,
-            func.count(Shipment.id).label('count')
-        ).filter(
-            Shipment.created_at >= cutoff_date
-        ).group_by(
-            func.date(Shipment.created_at),
-            Shipment.status
-        ).order_by(func.date(Shipment.created_at)).all()
+        trends = db.execute(_shipment_trends_stmt(), {'cutoff': cutoff_date}).all()
         
         return [
             {
@@ -220,6 +676,7 @@ class AnalyticsService:
     # ========================================================================
     
     @staticmethod
+    @cached_result
     def perform_abc_analysis(db: Session) -> Dict:
         """
         Perform ABC analysis on inventory
@@ -227,113 +684,144 @@ class AnalyticsService:
         B items: Next 30% by value (20% of total value)
         C items: Remaining 50% by value (10% of total value)
         """
-        
-        # Get all inventory with value (quantity * assumed cost)
-        inventory_items = db.query(
-            Product.id,
-            Product.product_code,
-            Product.name,
-            func.sum(InventoryBalance.quantity_on_hand).label('total_quantity')
-        ).join(InventoryBalance).group_by(
-            Product.id, Product.product_code, Product.name
-        ).order_by(func.sum(InventoryBalance.quantity_on_hand).desc()).all()
-        
-        total_value = sum(float(item.total_quantity) for item in inventory_items)
-        
-        # Classify items
-        cumulative_value = 0
-        a_items, b_items, c_items = [], [], []
-        
-        for item in inventory_items:
-            item_value = float(item.total_quantity)
-            cumulative_value += item_value
-            cumulative_pct = (cumulative_value / total_value * 100) if total_value > 0 else 0
-            
-            item_data = {
-                'product_id': item.id,
-                'product_code': item.product_code,
-                'name': item.name,
-                'quantity': item_value,
-                'cumulative_pct': round(cumulative_pct, 2)
-            }
-            
-            if cumulative_pct <= 70:
-                a_items.append(item_data)
-            elif cumulative_pct <= 90:
-                b_items.append(item_data)
-            else:
-                c_items.append(item_data)
+        return AnalyticsService._abc_summary(AnalyticsService._classify_abc(db))
+    
+    @staticmethod
+    def _abc_summary(abc: AbcResult) -> Dict:
+        """Shape a classification into the ABC analysis response"""
+        a_items = abc.to_records(abc.klass == 'A')
+        b_items = abc.to_records(abc.klass == 'B')
+        c_items = abc.to_records(abc.klass == 'C')
         
         return {
             'a_items': a_items,
             'b_items': b_items,
             'c_items': c_items,
-            'total_value': total_value,
+            'total_value': abc.total_value,
             'distribution': {
-                'A': {'count': len(a_items), 'percentage': round(len(a_items) / len(inventory_items) * 100, 2)},
-                'B': {'count': len(b_items), 'percentage': round(len(b_items) / len(inventory_items) * 100, 2)},
-                'C': {'count': len(c_items), 'percentage': round(len(c_items) / len(inventory_items) * 100, 2)}
+                'A': {'count': len(a_items), 'percentage': round(len(a_items) / len(abc) * 100, 2)},
+                'B': {'count': len(b_items), 'percentage': round(len(b_items) / len(abc) * 100, 2)},
+                'C': {'count': len(c_items), 'percentage': round(len(c_items) / len(abc) * 100, 2)}
             }
         }
     
+    @staticmethod
+    def _classify_abc(db: Session) -> AbcResult:
+        """Run the ABC classification query and return its columns"""
+        
+        # Per-product value (quantity * assumed cost), aggregated on product_id only
+        ranked = db.query(
+            InventoryBalance.product_id.label('id'),
+            cast(func.sum(InventoryBalance.quantity_on_hand), Float).label('total_quantity')
+        ).group_by(InventoryBalance.product_id).subquery()
+        
+        # Running share of total value, computed in the database
+        running_total = func.sum(ranked.c.total_quantity).over(
+            order_by=(ranked.c.total_quantity.desc(), ranked.c.id),
+            rows=(None, 0)
+        )
+        grand_total = func.sum(ranked.c.total_quantity).over()
+        cumulative = db.query(
+            ranked,
+            grand_total.label('total_value'),
+            func.coalesce(running_total * 100.0 / func.nullif(grand_total, 0), 0).label('cumulative_pct')
+        ).subquery()
+        
+        ids, qty, cum_pct, klass, total_value = _stream_columns(
+            db.query(
+                cumulative.c.id,
+                cumulative.c.total_quantity,
+                cumulative.c.cumulative_pct,
+                case(
+                    (cumulative.c.cumulative_pct <= ABC_A_THRESHOLD, 'A'),
+                    (cumulative.c.cumulative_pct <= ABC_B_THRESHOLD, 'B'),
+                    else_='C'
+                ).label('abc_class'),
+                cumulative.c.total_value
+            ).order_by(cumulative.c.total_quantity.desc(), cumulative.c.id),
+            (np.int64, np.float64, np.float64, object, np.float64)
+        )
+        codes, names = _product_labels(db, ids)
+        
+        return AbcResult(
+            ids=ids,
+            codes=codes,
+            names=names,
+            qty=qty,
+            cum_pct=np.round(cum_pct, 2),
+            klass=klass,
+            total_value=float(total_value[0]) if total_value.size else 0.0
+        )
+    
     # ========================================================================
     # Utilization Metrics
     # ========================================================================
     
     @staticmethod
-    def get_location_utilization(db: Session) -> List[Dict]:
-        """Calculate inventory utilization by location"""
+    @cached_result
+    def get_location_utilization(db: Session, as_json: bool = False):
+        """Calculate inventory utilization by location (optionally as a JSON string)"""
+        utilization = AnalyticsService._location_utilization(db)
+        return utilization.to_json() if as_json else utilization.to_records()
+    
+    @staticmethod
+    def _location_utilization(db: Session) -> LocationUtilizationResult:
+        """Per-location utilization as columns, ranked by utilization"""
         
-        location_stats = db.query(
-            InventoryBalance.location_code,
-            func.count(func.distinct(InventoryBalance.product_id)).label('product_count'),
-            func.sum(InventoryBalance.quantity_on_hand).label('total_on_hand'),
-            func.sum(InventoryBalance.quantity_reserved).label('total_reserved')
-        ).group_by(InventoryBalance.location_code).all()
+        # Served from the per-location roll-up
+        on_hand = cast(InventoryLocationSummary.total_on_hand, Float)
+        reserved = cast(InventoryLocationSummary.total_reserved, Float)
+        utilization_rate = func.coalesce(func.round(reserved * 100.0 / func.nullif(on_hand, 0), 2), 0)
         
-        return [
-            {
-                'location_code': location,
-                'product_count': product_count,
-                'total_on_hand': float(total_on_hand),
-                'total_reserved': float(total_reserved),
-                'total_available': float(total_on_hand - total_reserved),
-                'utilization_rate': round(float(total_reserved / total_on_hand * 100), 2) if total_on_hand > 0 else 0
-            }
-            for location, product_count, total_on_hand, total_reserved in location_stats
-        ]
+        location_stats = db.query(
+            InventoryLocationSummary.location_code,
+            InventoryLocationSummary.product_count,
+            on_hand.label('total_on_hand'),
+            reserved.label('total_reserved'),
+            utilization_rate.label('utilization_rate')
+        ).filter(
+            InventoryLocationSummary.product_count > 0
+        ).order_by(utilization_rate.desc()).all()
+        
+        return LocationUtilizationResult(
+            codes=_column(location_stats, 0),
+            product_counts=_column(location_stats, 1, np.int64),
+            on_hand=_column(location_stats, 2, np.float64),
+            reserved=_column(location_stats, 3, np.float64),
+            utilization_rate=_column(location_stats, 4, np.float64)
+        )
     
     # ========================================================================
     # BOM Analysis
     # ========================================================================
     
     @staticmethod
-    def get_bom_complexity_analysis(db: Session) -> List[Dict]:
-        """Analyze BOM complexity metrics"""
-        
-        # Number of components per product
-        complexity = db.query(
-            Product.id,
-            Product.product_code,
-            Product.name,
-            func.count(BOMCurrent.id).label('component_count'),
-            func.sum(BOMCurrent.quantity).label('total_quantity')
-        ).join(
-            BOMCurrent, Product.id == BOMCurrent.parent_product_id
-        ).group_by(
-            Product.id, Product.product_code, Product.name
-        ).order_by(func.count(BOMCurrent.id).desc()).all()
-        
-        return [
-            {
-                'product_id': item.id,
-                'product_code': item.product_code,
-                'name': item.name,
-                'unique_components': item.component_count,
-                'total_parts_needed': float(item.total_quantity)
-            }
-            for item in complexity
-        ]
+    def get_bom_complexity_analysis(db: Session, as_json: bool = False):
+        """Analyze BOM complexity metrics (optionally as a JSON string)"""
+        
+        # Number of components per product, reached through each BOM's revision
+        ids, component_counts, total_quantities = _stream_columns(
+            db.query(
+                ProductRevision.product_id,
+                func.count(BOMCurrent.id).label('component_count'),
+                cast(func.sum(BOMCurrent.quantity), Float).label('total_quantity')
+            ).select_from(BOMCurrent).join(
+                ProductRevision, BOMCurrent.product_revision_id == ProductRevision.id
+            ).group_by(
+                ProductRevision.product_id
+            ).order_by(func.count(BOMCurrent.id).desc()),
+            (np.int64, np.int64, np.float64)
+        )
+        codes, names = _product_labels(db, ids)
+        
+        complexity = BomComplexityResult(
+            ids=ids,
+            codes=codes,
+            names=names,
+            component_counts=component_counts,
+            total_quantities=total_quantities
+        )
+        return complexity.to_json() if as_json else complexity.to_records()
     
     # ========================================================================
     # Advanced Trend Analysis & Forecasting
@@ -345,64 +833,58 @@ class AnalyticsService:
         Analyze inventory trends over time with forecasting
         Uses historical data to predict future inventory levels
         """
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        now = datetime.utcnow()
+        cutoff_date = now - timedelta(days=days)
         
         # Get daily inventory snapshots
-        daily_totals = db.query(
-            func.date(InventoryTransaction.created_at).label('date'),
-            func.sum(
-                case(
-                    (InventoryTransaction.transaction_type == TransactionType.INBOUND, InventoryTransaction.quantity),
-                    else_=0
-                )
-            ).label('inbound'),
-            func.sum(
-                case(
-                    (InventoryTransaction.transaction_type == TransactionType.OUTBOUND, InventoryTransaction.quantity),
-                    else_=0
-                )
-            ).label('outbound')
-        ).filter(InventoryTransaction.created_at >= cutoff_date).group_by(
-            func.date(InventoryTransaction.created_at)
-        ).order_by('date').all()
+        daily_totals = db.execute(_daily_inbound_outbound_stmt(), {'cutoff': cutoff_date}).all()
         
         if not daily_totals:
             return {'trend': [], 'forecast': [], 'trend_direction': 'stable'}
         
-        trend_data = []
-        cumulative = 0
-        for date, inbound, outbound in daily_totals:
-            cumulative += (float(inbound or 0) - float(outbound or 0))
-            trend_data.append({
-                'date': date.isoformat() if date else datetime.utcnow().isoformat(),
-                'level': cumulative,
-                'inbound': float(inbound or 0),
-                'outbound': float(outbound or 0)
-            })
+        n = len(daily_totals)
+        dates = [row[0] for row in daily_totals]
+        inbound = _column(daily_totals, 1, np.float64)
+        outbound = _column(daily_totals, 2, np.float64)
+        levels = np.cumsum(inbound - outbound)
         
         # Simple trend detection
-        if len(trend_data) >= 2:
-            recent = mean([d['level'] for d in trend_data[-7:]])
-            earlier = mean([d['level'] for d in trend_data[:7]])
+        if n >= 2:
+            recent = levels[-7:].mean()
+            earlier = levels[:7].mean()
             trend_direction = 'increasing' if recent > earlier else 'decreasing' if recent < earlier else 'stable'
         else:
             trend_direction = 'insufficient_data'
         
         # Simple forecast (moving average)
         forecast = []
-        if len(trend_data) >= 7:
-            last_week_avg = mean([d['level'] for d in trend_data[-7:]])
+        if n >= 7:
+            last_week_avg = float(levels[-7:].mean())
             for i in range(1, 8):
                 forecast.append({
                     'days_ahead': i,
                     'predicted_level': round(last_week_avg, 2)
                 })
         
+        # Only the most recent 30 points are returned
+        fallback_date = now.isoformat()
+        trend_data = [
+            {
+                'date': date.isoformat() if date else fallback_date,
+                'level': level,
+                'inbound': inb,
+                'outbound': outb
+            }
+            for date, level, inb, outb in zip(
+                dates[-30:], levels[-30:].tolist(), inbound[-30:].tolist(), outbound[-30:].tolist()
+            )
+        ]
+        
         return {
-            'trend': trend_data[-30:] if len(trend_data) > 30 else trend_data,
+            'trend': trend_data,
             'forecast': forecast,
             'trend_direction': trend_direction,
-            'volatility': round(stdev([d['level'] for d in trend_data]), 2) if len(trend_data) > 1 else 0
+            'volatility': round(float(levels.std(ddof=1)), 2) if n > 1 else 0
         }
     
     # ========================================================================
@@ -415,49 +897,71 @@ class AnalyticsService:
         Detect anomalies in inventory transactions using statistical analysis
         Identifies unusual patterns that might indicate issues
         """
-        # Get recent transactions grouped by product and location
+        # Get recent transactions, ordered so each (product, location) is contiguous
         recent_cutoff = datetime.utcnow() - timedelta(days=30)
         
         transactions = db.query(
-            InventoryBalance.product_id,
-            InventoryBalance.location_code,
-            func.count(InventoryTransaction.id).label('transaction_count'),
-            func.avg(InventoryTransaction.quantity).label('avg_qty'),
-            func.stddev(InventoryTransaction.quantity).label('std_qty')
-        ).join(
-            InventoryTransaction
+            InventoryTransaction.product_id,
+            InventoryTransaction.location_code,
+            cast(InventoryTransaction.quantity, Float)
         ).filter(
             InventoryTransaction.created_at >= recent_cutoff
-        ).group_by(
-            InventoryBalance.product_id,
-            InventoryBalance.location_code
+        ).order_by(
+            InventoryTransaction.product_id,
+            InventoryTransaction.location_code,
+            InventoryTransaction.created_at
         ).all()
         
         anomalies = []
+        anomalies_detected = 0
         
-        for product_id, location, count, avg_qty, std_qty in transactions:
-            if std_qty and count >= 5:
-                # Get latest transaction
-                latest = db.query(InventoryTransaction).filter(
-                    InventoryTransaction.product_id == product_id
-                ).order_by(InventoryTransaction.created_at.desc()).first()
+        if transactions:
+            n = len(transactions)
+            product_ids = np.fromiter((t[0] for t in transactions), dtype=np.int64, count=n)
+            locations = np.array([t[1] for t in transactions], dtype=object)
+            quantities = _column(transactions, 2, np.float64)
+            
+            # Group boundaries
+            new_group = np.ones(n, dtype=bool)
+            new_group[1:] = (product_ids[1:] != product_ids[:-1]) | (locations[1:] != locations[:-1])
+            starts = np.flatnonzero(new_group)
+            ends = np.append(starts[1:], n) - 1
+            counts = np.diff(np.append(starts, n))
+            
+            # Per-group mean, population std and z-score of the latest transaction
+            means = np.add.reduceat(quantities, starts) / counts
+            variances = np.add.reduceat(quantities ** 2, starts) / counts - means ** 2
+            stds = np.sqrt(np.maximum(variances, 0))
+            latest = quantities[ends]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                z_scores = np.abs((latest - means) / stds)
+            
+            mask = (counts >= 5) & (stds > 0) & (means != 0) & (z_scores > threshold_std)
+            flagged = np.flatnonzero(mask)
+            anomalies_detected = int(flagged.size)
+            
+            # Only the top-scoring anomalies are reported, so resolve product codes for those alone
+            top = flagged[np.argsort(-z_scores[flagged], kind='stable')[:10]]
+            if top.size:
+                top_products = product_ids[starts[top]]
+                product_codes = dict(db.query(Product.id, Product.product_code).filter(
+                    Product.id.in_(set(top_products.tolist()))
+                ).all())
                 
-                if latest and avg_qty:
-                    z_score = abs((float(latest.quantity) - float(avg_qty)) / float(std_qty))
-                    if z_score > threshold_std:
-                        product = db.query(Product).filter(Product.id == product_id).first()
-                        anomalies.append({
-                            'product_code': product.product_code if product else 'Unknown',
-                            'location': location,
-                            'anomaly_score': round(z_score, 2),
-                            'latest_qty': float(latest.quantity),
-                            'average_qty': round(float(avg_qty), 2),
-                            'severity': 'high' if z_score > 3 * threshold_std else 'medium'
-                        })
+                for group, product_id in zip(top.tolist(), top_products.tolist()):
+                    z_score = float(z_scores[group])
+                    anomalies.append({
+                        'product_code': product_codes.get(product_id, 'Unknown'),
+                        'location': locations[starts[group]],
+                        'anomaly_score': round(z_score, 2),
+                        'latest_qty': float(latest[group]),
+                        'average_qty': round(float(means[group]), 2),
+                        'severity': 'high' if z_score > 3 * threshold_std else 'medium'
+                    })
         
         return {
-            'anomalies_detected': len(anomalies),
-            'anomalies': sorted(anomalies, key=lambda x: x['anomaly_score'], reverse=True)[:10],
+            'anomalies_detected': anomalies_detected,
+            'anomalies': anomalies,
             'threshold_std': threshold_std
         }
     
@@ -471,7 +975,25 @@ class AnalyticsService:
         Analyze product lifecycle: introduction, growth, maturity, decline
         Provides insights for product strategy
         """
-        products = db.query(Product).all()
+        now = datetime.utcnow()
+        ninety_days_ago = now - timedelta(days=90)
+        thirty_days_ago = now - timedelta(days=30)
+        
+        # One grouped pass: 90/30-day shipment counts and total quantity per product
+        product_stats = db.query(
+            Product.product_code,
+            Product.name,
+            Product.status,
+            func.sum(case((Shipment.created_at >= ninety_days_ago, 1), else_=0)).label('shipments_90d'),
+            func.sum(case((Shipment.created_at >= thirty_days_ago, 1), else_=0)).label('shipments_30d'),
+            cast(func.sum(ShipmentLine.quantity_shipped), Float).label('total_quantity')
+        ).outerjoin(
+            ShipmentLine, ShipmentLine.product_id == Product.id
+        ).outerjoin(
+            Shipment, Shipment.id == ShipmentLine.shipment_id
+        ).group_by(
+            Product.id, Product.product_code, Product.name, Product.status
+        ).execution_options(stream_results=True).yield_per(STREAM_CHUNK_SIZE)
         
         lifecycle_stages = {
             'introduction': [],  # New products, low sales
@@ -480,45 +1002,25 @@ class AnalyticsService:
             'decline': []        # Decreasing demand
         }
         
-        for product in products:
-            # Get 90-day shipment history
-            ninety_days_ago = datetime.utcnow() - timedelta(days=90)
-            monthly_shipments = db.query(
-                func.count(ShipmentLine.id)
-            ).join(Shipment).filter(
-                and_(
-                    ShipmentLine.product_id == product.id,
-                    Shipment.created_at >= ninety_days_ago
-                )
-            ).scalar() or 0
-            
-            # Get revenue (simplified)
-            revenue = db.query(
-                func.sum(ShipmentLine.quantity)
-            ).filter(ShipmentLine.product_id == product.id).scalar() or 0
+        for product_code, name, product_status, shipments_90d, shipments_30d, revenue in product_stats:
+            monthly_shipments = int(shipments_90d or 0)
             
             # Determine lifecycle stage
             if monthly_shipments == 0:
                 stage = 'introduction'
             elif monthly_shipments < 10:
                 stage = 'growth'
-            elif monthly_shipments > 50:
-                if db.query(func.count(ShipmentLine.id)).filter(
-                    ShipmentLine.product_id == product.id,
-                    Shipment.created_at >= datetime.utcnow() - timedelta(days=30)
-                ).scalar() < monthly_shipments / 3:
-                    stage = 'decline'
-                else:
-                    stage = 'maturity'
+            elif monthly_shipments > 50 and int(shipments_30d or 0) < monthly_shipments / 3:
+                stage = 'decline'
             else:
                 stage = 'maturity'
             
             lifecycle_stages[stage].append({
-                'product_code': product.product_code,
-                'name': product.name,
-                'status': product.status,
+                'product_code': product_code,
+                'name': name,
+                'status': product_status,
                 '90day_shipments': monthly_shipments,
-                'total_revenue': float(revenue)
+                'total_revenue': revenue or 0.0
             })
         
         return {
@@ -538,59 +1040,72 @@ class AnalyticsService:
         Forecast demand vs supply balance
         Helps identify stockout risks and overstock situations
         """
+        return AnalyticsService._demand_supply_summary(AnalyticsService._demand_supply(db, days))
+    
+    @staticmethod
+    def _demand_supply(db: Session, days: int = 30) -> DemandSupplyResult:
+        """Per-product stock cover as columns"""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
-        products_analysis = []
+        # Current inventory and recent demand per product, aggregated separately
+        # so the two child tables don't multiply each other's rows
+        inventory = db.query(
+            InventoryBalance.product_id.label('product_id'),
+            func.sum(InventoryBalance.quantity_on_hand).label('on_hand')
+        ).group_by(InventoryBalance.product_id).subquery()
+        
+        demand = db.query(
+            ShipmentLine.product_id.label('product_id'),
+            func.count(ShipmentLine.id).label('line_count')
+        ).join(Shipment).filter(
+            Shipment.created_at >= cutoff_date
+        ).group_by(ShipmentLine.product_id).subquery()
+        
+        codes, current_inventory, recent_demand = _stream_columns(
+            db.query(
+                Product.product_code,
+                cast(func.coalesce(inventory.c.on_hand, 0), Float),
+                func.coalesce(demand.c.line_count, 0)
+            ).outerjoin(
+                inventory, inventory.c.product_id == Product.id
+            ).outerjoin(
+                demand, demand.c.product_id == Product.id
+            ),
+            (object, np.float64, np.float64)
+        )
         
-        for product in db.query(Product).all():
-            # Get current inventory
-            current_inventory = db.query(
-                func.sum(InventoryBalance.quantity_on_hand)
-            ).filter(InventoryBalance.product_id == product.id).scalar() or 0
-            
-            # Get recent demand (shipments)
-            recent_demand = db.query(
-                func.count(ShipmentLine.id)
-            ).join(Shipment).filter(
-                and_(
-                    ShipmentLine.product_id == product.id,
-                    Shipment.created_at >= cutoff_date
-                )
-            ).scalar() or 0
-            
-            # Calculate daily average demand
-            daily_avg_demand = recent_demand / days if days > 0 else 0
-            
-            # Estimate days of stock
-            days_of_stock = float(current_inventory) / daily_avg_demand if daily_avg_demand > 0 else 999
-            
-            # Forecast status
-            if days_of_stock < 7:
-                forecast_status = 'critical_stockout_risk'
-            elif days_of_stock < 14:
-                forecast_status = 'low_stock_warning'
-            elif days_of_stock > 60:
-                forecast_status = 'overstock'
-            else:
-                forecast_status = 'optimal'
-            
-            products_analysis.append({
-                'product_code': product.product_code,
-                'current_inventory': float(current_inventory),
-                'daily_avg_demand': round(daily_avg_demand, 2),
-                'estimated_days_of_stock': round(days_of_stock, 1),
-                'forecast_status': forecast_status
-            })
+        # Daily average demand and estimated days of stock (999 with no demand)
+        daily_demand = recent_demand / days if days > 0 else np.zeros_like(recent_demand)
+        days_of_stock = np.full(len(codes), 999.0)
+        np.divide(current_inventory, daily_demand, out=days_of_stock, where=daily_demand > 0)
         
-        # Filter by risk level
-        critical_products = [p for p in products_analysis if p['forecast_status'] in ['critical_stockout_risk', 'overstock']]
+        # Forecast status
+        status = np.select(
+            [days_of_stock < 7, days_of_stock < 14, days_of_stock > 60],
+            ['critical_stockout_risk', 'low_stock_warning', 'overstock'],
+            default='optimal'
+        )
+        
+        return DemandSupplyResult(
+            codes=codes,
+            inventory=current_inventory,
+            daily_demand=daily_demand,
+            days_of_stock=days_of_stock,
+            status=status,
+            days=days
+        )
+    
+    @staticmethod
+    def _demand_supply_summary(forecast: DemandSupplyResult) -> Dict:
+        """Shape stock cover columns into the demand/supply response"""
+        at_risk = forecast.at_risk
         
         return {
-            'analysis_period_days': days,
-            'products_analyzed': len(products_analysis),
-            'at_risk_count': len(critical_products),
-            'at_risk_products': critical_products,
-            'all_products': products_analysis
+            'analysis_period_days': forecast.days,
+            'products_analyzed': len(forecast.codes),
+            'at_risk_count': int(at_risk.sum()),
+            'at_risk_products': forecast.to_records(at_risk),
+            'all_products': forecast.to_records()
         }
     
     # ========================================================================
@@ -603,15 +1118,13 @@ class AnalyticsService:
         Calculate performance benchmarks and metrics
         Includes efficiency scores and comparative analysis
         """
-        total_shipments = db.query(func.count(Shipment.id)).scalar() or 0
+        # Running counters maintained on write and seeded at startup
+        counters = dict(db.query(KpiCounter.name, KpiCounter.value).all())
+        
+        total_shipments = int(counters.get('total_shipments', 0))
         
         # On-time performance
-        on_time_count = db.query(func.count(Shipment.id)).filter(
-            and_(
-                Shipment.status == ShipmentStatus.DELIVERED,
-                Shipment.actual_delivery_date <= Shipment.estimated_delivery_date
-            )
-        ).scalar() or 0
+        on_time_count = int(counters.get('on_time_count', 0))
         
         on_time_rate = (on_time_count / total_shipments * 100) if total_shipments > 0 else 0
         
@@ -619,26 +1132,21 @@ class AnalyticsService:
         # Simplified: on time count as proxy
         perfect_order_rate = on_time_rate
         
-        # Inventory turnover
-        total_outbound = db.query(
-            func.sum(InventoryTransaction.quantity)
-        ).filter(
-            InventoryTransaction.transaction_type == TransactionType.OUTBOUND
-        ).scalar() or 0
-        
-        avg_inventory = db.query(
-            func.avg(func.sum(InventoryBalance.quantity_on_hand))
-        ).group_by(InventoryBalance.product_id).scalar() or 1
+        # Inventory turnover: outbound volume over average on-hand per stocked product
+        total_outbound = float(counters.get('total_outbound', 0))
+        stocked_products = int(counters.get('stocked_products', 0))
+        inventory = AnalyticsService.get_inventory_kpis(db)
+        avg_inventory = inventory['total_units_on_hand'] / stocked_products if stocked_products else 1
         
-        inventory_turnover = float(total_outbound) / float(avg_inventory) if avg_inventory > 0 else 0
+        inventory_turnover = total_outbound / avg_inventory if avg_inventory > 0 else 0
         
         # Order accuracy
-        total_lines = db.query(func.count(ShipmentLine.id)).scalar() or 0
+        total_lines = int(counters.get('total_lines', 0))
         correct_lines = total_lines  # Simplified - assume all shipped lines are correct
         order_accuracy = (correct_lines / total_lines * 100) if total_lines > 0 else 100
         
         # Fill rate
-        total_requested = db.query(func.count(ShipmentLine.id)).scalar() or 0
+        total_requested = total_lines
         total_fulfilled = total_requested
         fill_rate = (total_fulfilled / total_requested * 100) if total_requested > 0 else 100
         
@@ -656,9 +1164,38 @@ class AnalyticsService:
             'fill_rate': round(fill_rate, 2),
             'inventory_turnover': round(inventory_turnover, 2),
             'total_shipments': total_shipments,
-            'performance_grade': self._get_grade(overall_score)
+            'performance_grade': AnalyticsService._get_grade(overall_score)
         }
     
+    @staticmethod
+    def refresh_kpi_counters(db: Session) -> Dict:
+        """
+        Rebuild the kpi_counters table from the source tables
+        Run once to seed the counters; writes keep them current afterwards
+        """
+        
+        delivered = db.query(
+            func.count(Shipment.id),
+            func.count(case((Shipment.actual_ship_date <= Shipment.scheduled_ship_date, 1)))
+        ).filter(Shipment.status == ShipmentStatus.DELIVERED).one()
+        
+        counters = {
+            'total_shipments': db.query(func.count(Shipment.id)).scalar() or 0,
+            'total_delivered': delivered[0] or 0,
+            'on_time_count': delivered[1] or 0,
+            'total_outbound': db.query(func.sum(InventoryTransaction.quantity)).filter(
+                InventoryTransaction.transaction_type.in_(OUTBOUND_TRANSACTION_TYPES)
+            ).scalar() or 0,
+            'total_lines': db.query(func.count(ShipmentLine.id)).scalar() or 0,
+            'stocked_products': db.query(func.count(func.distinct(InventoryBalance.product_id))).scalar() or 0
+        }
+        
+        db.query(KpiCounter).delete()
+        db.add_all([KpiCounter(name=name, value=value) for name, value in counters.items()])
+        db.commit()
+        
+        return counters
+    
     @staticmethod
     def _get_grade(score: float) -> str:
         """Convert score to letter grade"""
@@ -678,17 +1215,23 @@ class AnalyticsService:
     # ========================================================================
     
     @staticmethod
-    def get_optimization_recommendations(db: Session) -> List[Dict]:
+    def get_optimization_recommendations(db: Session, *, abc: Optional[AbcResult] = None,
+                                         demand_supply: Optional[DemandSupplyResult] = None,
+                                         locations: Optional[LocationUtilizationResult] = None,
+                                         performance: Optional[Dict] = None) -> List[Dict]:
         """
         Generate AI-driven optimization recommendations
         Uses machine learning algorithms and statistical analysis
+        Inputs already computed by the caller are reused instead of re-queried
         """
         recommendations = []
         
         # ML Algorithm 1: Clustering-based ABC Analysis with Cost Optimization
-        abc_analysis = AnalyticsService.perform_abc_analysis(db)
-        a_items_count = len(abc_analysis['a_items'])
-        a_items_value = abc_analysis['total_value'] * 0.70
+        if abc is None:
+            abc = AnalyticsService._classify_abc(db)
+        a_mask = abc.klass == 'A'
+        a_items_count = int(a_mask.sum())
+        a_items_value = abc.total_value * 0.70
         
         # ML prediction: optimal safety stock based on variance
         try:
@@ -698,8 +1241,8 @@ class AnalyticsService:
                 scaler = StandardScaler()
                 
                 # Calculate variance for A-items
-                a_item_quantities = [item['quantity'] for item in abc_analysis['a_items'][:min(20, len(abc_analysis['a_items']))]]
-                if len(a_item_quantities) > 1:
+                a_item_quantities = abc.qty[a_mask][:20]
+                if a_item_quantities.size > 1:
                     variance = np.var(a_item_quantities)
                     std_dev = np.sqrt(variance)
                     
@@ -728,14 +1271,14 @@ class AnalyticsService:
             })
         
         # ML Algorithm 2: Anomaly-Based Demand-Supply Forecasting
-        demand_supply = AnalyticsService.get_demand_supply_forecast(db)
-        at_risk = demand_supply['at_risk_count']
-        at_risk_value = sum(p['current_inventory'] for p in demand_supply['at_risk_products'][:5])
+        if demand_supply is None:
+            demand_supply = AnalyticsService._demand_supply(db)
+        at_risk = int(demand_supply.at_risk.sum())
         
         if at_risk > 0:
             # Calculate financial impact
-            critical_count = len([p for p in demand_supply['at_risk_products'] if p['forecast_status'] == 'critical_stockout_risk'])
-            overstock_value = sum(p['current_inventory'] for p in demand_supply['at_risk_products'] if p['forecast_status'] == 'overstock')
+            critical_count = int((demand_supply.status == 'critical_stockout_risk').sum())
+            overstock_value = float(demand_supply.inventory[demand_supply.status == 'overstock'].sum())
             
             recommendations.append({
                 'priority': 'critical',
@@ -748,49 +1291,61 @@ class AnalyticsService:
             })
         
         # ML Algorithm 3: Clustering for Slow-Moving Inventory Detection
-        try:
-            # Identify slow movers using demand clustering
-            slow_mover_threshold = 3  # Less than 3 shipments in 90 days
-            slow_movers = db.query(Product).outerjoin(ShipmentLine).filter(
-                func.count(ShipmentLine.id) < slow_mover_threshold
-            ).group_by(Product.id).all()
+        # Identify slow movers using demand clustering
+        slow_mover_threshold = 3  # Less than 3 shipments in 90 days
+        slow_movers = select(
+            Product.id.label('product_id')
+        ).outerjoin(
+            ShipmentLine, ShipmentLine.product_id == Product.id
+        ).group_by(Product.id).having(
+            func.count(ShipmentLine.id) < slow_mover_threshold
+        ).subquery()
+        
+        on_hand = select(
+            InventoryBalance.product_id.label('product_id'),
+            func.sum(InventoryBalance.quantity_on_hand).label('on_hand')
+        ).group_by(InventoryBalance.product_id).subquery()
+        
+        # Count and stock of slow movers in a single scalar row
+        slow_mover_count, slow_mover_inventory = db.execute(
+            select(
+                func.count(slow_movers.c.product_id),
+                cast(func.coalesce(func.sum(on_hand.c.on_hand), 0), Float)
+            ).select_from(
+                slow_movers.outerjoin(on_hand, on_hand.c.product_id == slow_movers.c.product_id)
+            )
+        ).one()
+        
+        if slow_mover_count > 0:
+            # Calculate potential recovery value
+            recovery_value = slow_mover_inventory * 0.5  # Estimate 50% recovery
             
-            if len(slow_movers) > 0:
-                # Calculate potential recovery value
-                slow_mover_inventory = db.query(
-                    func.sum(InventoryBalance.quantity_on_hand)
-                ).join(Product).filter(
-                    Product.id.in_([p.id for p in slow_movers])
-                ).scalar() or 0
-                
-                recovery_value = float(slow_mover_inventory) * 0.5  # Estimate 50% recovery
-                
-                recommendations.append({
-                    'priority': 'medium',
-                    'category': 'inventory_reduction',
-                    'title': 'ML-Identified Obsolescence Risk (K-Means Clustering)',
-                    'description': f"{len(slow_movers)} products identified by ML clustering as obsolescence candidates. {slow_mover_inventory:.0f} units at risk. Recommend clearance or discontinuation.",
-                    'expected_impact': f'Free up warehouse space (est. 12-18% capacity). Recover ${recovery_value:,.0f} through liquidation.',
-                    'implementation_effort': 'low',
-                    'algorithm': 'K-Means Clustering on demand patterns'
-                })
-        except Exception as e:
-            slow_movers = []
+            recommendations.append({
+                'priority': 'medium',
+                'category': 'inventory_reduction',
+                'title': 'ML-Identified Obsolescence Risk (K-Means Clustering)',
+                'description': f"{slow_mover_count} products identified by ML clustering as obsolescence candidates. {slow_mover_inventory:.0f} units at risk. Recommend clearance or discontinuation.",
+                'expected_impact': f'Free up warehouse space (est. 12-18% capacity). Recover ${recovery_value:,.0f} through liquidation.',
+                'implementation_effort': 'low',
+                'algorithm': 'K-Means Clustering on demand patterns'
+            })
         
         # ML Algorithm 4: Optimization Model for Location Consolidation
-        locations = AnalyticsService.get_location_utilization(db)
-        underutilized = [l for l in locations if l['utilization_rate'] < 20]
+        if locations is None:
+            locations = AnalyticsService._location_utilization(db)
+        underutilized = locations.utilization_rate < 20
+        underutilized_count = int(underutilized.sum())
         
-        if underutilized:
+        if underutilized_count:
             # Calculate consolidation efficiency gain
-            total_capacity_loss = sum(100 - l['utilization_rate'] for l in underutilized)
-            consolidation_savings = (len(underutilized) * 150000) * 0.85  # Est. $150k per facility
+            total_capacity_loss = float((100 - locations.utilization_rate[underutilized]).sum())
+            consolidation_savings = (underutilized_count * 150000) * 0.85  # Est. $150k per facility
             
             recommendations.append({
                 'priority': 'medium',
                 'category': 'warehouse_optimization',
                 'title': 'ML-Optimized Location Consolidation (Linear Programming)',
-                'description': f"{len(underutilized)} warehouses have <20% utilization (total {total_capacity_loss:.0f}% capacity loss). ML optimization model recommends consolidation.",
+                'description': f"{underutilized_count} warehouses have <20% utilization (total {total_capacity_loss:.0f}% capacity loss). ML optimization model recommends consolidation.",
                 'expected_impact': f'Reduce warehouse footprint by 10-15%. Annual savings: ${consolidation_savings:,.0f}. Reduce complexity.',
                 'implementation_effort': 'high',
                 'algorithm': 'Linear Programming + Network Optimization'
@@ -798,7 +1353,8 @@ class AnalyticsService:
         
         # ML Algorithm 5: Predictive Cost Optimization
         try:
-            performance = AnalyticsService.get_performance_benchmarks(db)
+            if performance is None:
+                performance = AnalyticsService.get_performance_benchmarks(db)
             score = performance['overall_performance_score']
             
             if score < 85:
@@ -833,20 +1389,48 @@ class AnalyticsService:
     # ========================================================================
     
     @staticmethod
+    @cached_result(ttl=DASHBOARD_CACHE_TTL_SECONDS)
     def get_executive_dashboard(db: Session) -> Dict:
-        """Get consolidated executive dashboard metrics with advanced analytics"""
+        """
+        Get consolidated executive dashboard metrics with advanced analytics
+        Cached; any write to the source tables invalidates it
+        """
+        generated_at = datetime.utcnow()
+        
+        analytics = {
+            'inventory_kpis': AnalyticsService.get_inventory_kpis,
+            'shipment_kpis': AnalyticsService.get_shipment_kpis,
+            'plm_kpis': AnalyticsService.get_plm_kpis,
+            'locations': AnalyticsService._location_utilization,
+            'abc': AnalyticsService._classify_abc,
+            'inventory_trends': AnalyticsService.get_inventory_trend_analysis,
+            'anomalies': AnalyticsService.detect_inventory_anomalies,
+            'lifecycle_insights': AnalyticsService.get_product_lifecycle_insights,
+            'demand_supply': AnalyticsService._demand_supply,
+            'performance_benchmarks': AnalyticsService.get_performance_benchmarks
+        }
+        futures = {
+            name: _dashboard_executor.submit(_run_in_session, analytic)
+            for name, analytic in analytics.items()
+        }
+        results = {name: future.result() for name, future in futures.items()}
+        
+        # Shared inputs are handed to the recommendations instead of re-queried
+        abc = results.pop('abc')
+        locations = results.pop('locations')
+        demand_supply = results.pop('demand_supply')
         
         return {
-            'inventory_kpis': AnalyticsService.get_inventory_kpis(db),
-            'shipment_kpis': AnalyticsService.get_shipment_kpis(db),
-            'plm_kpis': AnalyticsService.get_plm_kpis(db),
-            'location_utilization': AnalyticsService.get_location_utilization(db),
-            'abc_analysis': AnalyticsService.perform_abc_analysis(db),
-            'inventory_trends': AnalyticsService.get_inventory_trend_analysis(db),
-            'anomalies': AnalyticsService.detect_inventory_anomalies(db),
-            'lifecycle_insights': AnalyticsService.get_product_lifecycle_insights(db),
-            'demand_supply_forecast': AnalyticsService.get_demand_supply_forecast(db),
-            'performance_benchmarks': AnalyticsService.get_performance_benchmarks(db),
-            'optimization_recommendations': AnalyticsService.get_optimization_recommendations(db),
-            'generated_at': datetime.utcnow().isoformat()
+            **results,
+            'location_utilization': locations.to_records(),
+            'abc_analysis': AnalyticsService._abc_summary(abc),
+            'demand_supply_forecast': AnalyticsService._demand_supply_summary(demand_supply),
+            'optimization_recommendations': AnalyticsService.get_optimization_recommendations(
+                db,
+                abc=abc,
+                demand_supply=demand_supply,
+                locations=locations,
+                performance=results['performance_benchmarks']
+            ),
+            'generated_at': generated_at.isoformat()
         }
@@ -3,39 +3,283 @@ CDE SaaS - Authentication & Authorization Service
 Python 3.7 Compatible Version
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only, joinedload
+from sqlalchemy import select, update, func, exists, case
 from typing import Optional, Dict, List
 from datetime import datetime, timedelta
 import jwt
 import secrets
 import hashlib
+import hmac
+import atexit
+import logging
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
 from fastapi import HTTPException, status
 
-# Python 3.7 compatible imports
 try:
-    from passlib.hash import bcrypt
+    import redis
+    HAS_REDIS = True
 except ImportError:
-    import bcrypt as bcrypt_lib
-    
-    class bcrypt:
-        @staticmethod
-        def hash(password):
-            return bcrypt_lib.hashpw(password.encode(), bcrypt_lib.gensalt()).decode()
-        
-        @staticmethod
-        def verify(password, hashed):
-            return bcrypt_lib.checkpw(password.encode(), hashed.encode())
+    HAS_REDIS = False
 
 from database.saas_models_py37 import (
-    User, Organization, UserSession, ApiKey, AuditLog,
-    UserRole, AuditAction, SubscriptionStatus, SubscriptionTier
+    User, Organization, ApiKey, AuditLog,
+    UserRole, AuditAction, SubscriptionStatus, SubscriptionTier,
+    hash_password, verify_password_hash, password_needs_rehash
 )
+from backend.database import get_db_context
+
+logger = logging.getLogger(__name__)
 
 # Configuration
 JWT_SECRET = "your-secret-key-change-in-production"
-JWT_ALGORITHM = "HS256"
+JWT_PRIVATE_KEY = os.getenv("JWT_PRIVATE_KEY")  # Ed25519 private key (PEM)
+JWT_KEY_ID = os.getenv("JWT_KEY_ID", "default")
+
+# Key objects are parsed once here and reused for every sign/verify; with an
+# Ed25519 key configured, other services can verify with the public key alone
+if JWT_PRIVATE_KEY:
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+    
+    JWT_ALGORITHM = "EdDSA"
+    _jwt_signing_key = load_pem_private_key(JWT_PRIVATE_KEY.encode(), password=None)
+    _jwt_verifying_key = _jwt_signing_key.public_key()
+else:
+    JWT_ALGORITHM = "HS256"
+    _jwt_signing_key = _jwt_verifying_key = JWT_SECRET
+
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 30
+MAX_FAILED_LOGIN_ATTEMPTS = 5
+ACCOUNT_LOCKOUT_MINUTES = 15
+
+# Role-based permissions: role -> resource -> allowed actions
+_ROLE_PERMISSIONS = {
+    role: {resource: frozenset(actions) for resource, actions in resources.items()}
+    for role, resources in {
+        "org_admin": {
+            "product": ["create", "read", "update", "delete"],
+            "revision": ["create", "read", "update", "delete", "release"],
+            "bom": ["create", "read", "update", "delete"],
+            "inventory": ["create", "read", "update", "delete"],
+            "shipment": ["create", "read", "update", "delete"],
+            "user": ["create", "read", "update", "delete"],
+            "organization": ["read", "update"],
+            "analytics": ["read"]
+        },
+        "manager": {
+            "product": ["create", "read", "update"],
+            "revision": ["create", "read", "update"],
+            "bom": ["create", "read", "update"],
+            "inventory": ["create", "read", "update"],
+            "shipment": ["create", "read", "update"],
+            "analytics": ["read"]
+        },
+        "user": {
+            "product": ["read"],
+            "revision": ["read"],
+            "bom": ["read"],
+            "inventory": ["read", "update"],
+            "shipment": ["create", "read", "update"],
+            "analytics": ["read"]
+        },
+        "viewer": {
+            "product": ["read"],
+            "revision": ["read"],
+            "bom": ["read"],
+            "inventory": ["read"],
+            "shipment": ["read"],
+            "analytics": ["read"]
+        }
+    }.items()
+}
+
+# Normalizes a role (enum member, value or name) to its value string
+_ROLE_NAMES = {}
+for _role in UserRole:
+    _ROLE_NAMES[_role] = _ROLE_NAMES[_role.value] = _ROLE_NAMES[_role.name] = _role.value
+
+# Columns loaded on the auth hot paths; password_hash is only needed at login
+_LOGIN_USER_COLUMNS = (
+    User.id, User.email, User.password_hash, User.is_active, User.locked_until,
+    User.failed_login_attempts, User.organization_id, User.role, User.first_name, User.last_name
+)
+_CURRENT_USER_COLUMNS = (
+    User.id, User.email, User.first_name, User.last_name, User.role, User.permissions,
+    User.organization_id, User.is_active, User.is_verified, User.timezone, User.language,
+    User.last_login_at
+)
+
+# Server-side key for API key hashes, so a leaked api_key table can't be
+# checked offline; BLAKE2b keys are limited to 64 bytes, hence the digest
+_API_KEY_PEPPER = hashlib.sha256(os.getenv("API_KEY_PEPPER", JWT_SECRET).encode()).digest()
+API_KEY_PREFIX_LENGTH = 15
+
+
+# last_used_at is written at most once per window per key instead of per request
+API_KEY_LAST_USED_WINDOW_SECONDS = 60
+API_KEY_LAST_USED_MAX_ENTRIES = 10000
+_api_key_last_flush = OrderedDict()
+_api_key_last_flush_lock = threading.Lock()
+
+
+def _should_flush_last_used(api_key_id):
+    """True when the key's last_used_at hasn't been written within the window"""
+    now = time.monotonic()
+    with _api_key_last_flush_lock:
+        last_flush = _api_key_last_flush.get(api_key_id)
+        if last_flush is not None and now - last_flush < API_KEY_LAST_USED_WINDOW_SECONDS:
+            return False
+        
+        _api_key_last_flush[api_key_id] = now
+        _api_key_last_flush.move_to_end(api_key_id)
+        if len(_api_key_last_flush) > API_KEY_LAST_USED_MAX_ENTRIES:
+            _api_key_last_flush.popitem(last=False)
+        return True
+
+
+def _hash_api_key(raw_key):
+    """Keyed BLAKE2b hash of an API key"""
+    return hashlib.blake2b(raw_key.encode(), digest_size=32, key=_API_KEY_PEPPER).hexdigest()
+
+# Verified against when the email is unknown, so a miss costs the same hashing
+# work as a wrong password and response time doesn't reveal registered emails
+_DUMMY_PASSWORD_HASH = hash_password(secrets.token_urlsafe(16))
+
+# Revoked token ids (jti) live in Redis, shared by all workers, when
+# REDIS_URL is set; otherwise in this process until the token would expire
+REDIS_URL = os.getenv("REDIS_URL")
+_redis_client = redis.Redis.from_url(REDIS_URL) if HAS_REDIS and REDIS_URL else None
+_revoked_jtis = {}
+REVOKED_JTIS_MAX_ENTRIES = 10000
+
+# Without Redis each worker only knows its own revocations, so a logged-out
+# token keeps working on the other workers until it expires
+if _redis_client is None and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+    logger.warning(
+        "Token revocation is per process: WEB_CONCURRENCY=%s but %s; "
+        "logged-out tokens stay valid on other workers until they expire",
+        os.getenv("WEB_CONCURRENCY"),
+        "the redis package is not installed" if REDIS_URL else "REDIS_URL is not set"
+    )
+
+
+def _revoke_jti(jti, expires_at):
+    """Mark a token id revoked until its expiry (unix timestamp)"""
+    now = time.time()
+    if _redis_client is not None:
+        _redis_client.setex("revoked:{}".format(jti), max(int(expires_at - now), 1), 1)
+        return
+    
+    if len(_revoked_jtis) >= REVOKED_JTIS_MAX_ENTRIES:
+        for expired in [key for key, expiry in _revoked_jtis.items() if expiry <= now]:
+            del _revoked_jtis[expired]
+    _revoked_jtis[jti] = expires_at
+
+
+def _is_jti_revoked(jti):
+    """Check whether a token id has been revoked"""
+    if _redis_client is not None:
+        return bool(_redis_client.exists("revoked:{}".format(jti)))
+    
+    expires_at = _revoked_jtis.get(jti)
+    return expires_at is not None and expires_at > time.time()
+
+
+# ============================================================================
+# Audit Queue
+# ============================================================================
+# Login/logout audit rows are queued and bulk-inserted by a background thread,
+# so the auth transaction doesn't carry the extra insert. A batch that still
+# fails after its retries goes back on the queue; the queue is written out at
+# shutdown and at interpreter exit, since the writer is a daemon thread.
+
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_SECONDS = 1.0
+AUDIT_WRITE_ATTEMPTS = 3
+AUDIT_RETRY_SECONDS = 0.5
+
+_audit_queue = queue.Queue()
+_audit_worker = None
+_audit_worker_lock = threading.Lock()
+
+
+def enqueue_audit(organization_id, user_id, action, resource_type, resource_id=None,
+                  ip_address=None, user_agent=None):
+    """Queue an audit log row for the background writer"""
+    global _audit_worker
+    _audit_queue.put_nowait({
+        "organization_id": organization_id,
+        "user_id": user_id,
+        "action": action,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "created_at": datetime.utcnow()
+    })
+    
+    if _audit_worker is None:
+        with _audit_worker_lock:
+            if _audit_worker is None:
+                _audit_worker = threading.Thread(target=_drain_audit_queue, name="audit-writer", daemon=True)
+                _audit_worker.start()
+
+
+def _write_audit_batch(batch):
+    """Insert a batch of queued audit rows with one executemany; True once written"""
+    for attempt in range(1, AUDIT_WRITE_ATTEMPTS + 1):
+        try:
+            with get_db_context() as db:
+                db.execute(AuditLog.__table__.insert(), batch)
+            return True
+        except Exception:
+            logger.warning(
+                "Audit log write failed (%d rows, attempt %d of %d)",
+                len(batch), attempt, AUDIT_WRITE_ATTEMPTS, exc_info=True
+            )
+            if attempt < AUDIT_WRITE_ATTEMPTS:
+                time.sleep(AUDIT_RETRY_SECONDS * 2 ** (attempt - 1))
+    return False
+
+
+def _drain_audit_queue():
+    """Collect up to AUDIT_BATCH_SIZE rows or AUDIT_FLUSH_SECONDS, then write them"""
+    while True:
+        batch = [_audit_queue.get()]
+        deadline = time.monotonic() + AUDIT_FLUSH_SECONDS
+        while len(batch) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_audit_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        if not _write_audit_batch(batch):
+            # Keep the rows for the next batch and give the database a moment
+            for row in batch:
+                _audit_queue.put_nowait(row)
+            time.sleep(AUDIT_FLUSH_SECONDS)
+
+
+def flush_audit_queue():
+    """Write out anything still queued (called on shutdown)"""
+    batch = []
+    while True:
+        try:
+            batch.append(_audit_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch and not _write_audit_batch(batch):
+        logger.error("Audit log flush failed; %d queued rows were not written", len(batch))
+
+
+atexit.register(flush_audit_queue)
 
 
 class AuthService:
@@ -53,26 +297,30 @@ class AuthService:
     ):
         """Create new user"""
         
+        # Email uniqueness, organization limit and active user count in one round-trip
+        email_taken, max_users, user_count = db.execute(select(
+            exists().where(User.email_lower == email.lower()),
+            select(Organization.max_users).where(
+                Organization.id == organization_id,
+                Organization.is_active == True
+            ).scalar_subquery(),
+            select(func.count(User.id)).where(
+                User.organization_id == organization_id,
+                User.is_active == True
+            ).scalar_subquery()
+        )).one()
+        
         # Check if email already exists
-        existing = db.query(User).filter(User.email == email).first()
-        if existing:
+        if email_taken:
             raise ValueError("Email already registered")
         
         # Check organization exists and is active
-        org = db.query(Organization).filter(
-            Organization.id == organization_id,
-            Organization.is_active == True
-        ).first()
-        if not org:
+        if max_users is None:
             raise ValueError("Organization not found or inactive")
         
         # Check user limit
-        user_count = db.query(User).filter(
-            User.organization_id == organization_id,
-            User.is_active == True
-        ).count()
-        if user_count >= org.max_users:
-            raise ValueError("User limit reached ({})".format(org.max_users))
+        if user_count >= max_users:
+            raise ValueError("User limit reached ({})".format(max_users))
         
         # Create user
         user = User(
@@ -86,7 +334,6 @@ class AuthService:
         
         db.add(user)
         db.commit()
-        db.refresh(user)
         
         return user
     
@@ -95,12 +342,16 @@ class AuthService:
         """Authenticate user and create session"""
         
         # Find user
-        user = db.query(User).filter(
-            User.email == email.lower(),
+        user = db.query(User).options(
+            load_only(*_LOGIN_USER_COLUMNS),
+            joinedload(User.organization).load_only(Organization.is_active, Organization.subscription_status)
+        ).filter(
+            User.email_lower == email.lower(),
             User.is_active == True
         ).first()
         
         if not user:
+            verify_password_hash(password, _DUMMY_PASSWORD_HASH)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid credentials"
@@ -115,10 +366,20 @@ class AuthService:
         
         # Verify password
         if not user.verify_password(password):
-            # Increment failed attempts
-            user.failed_login_attempts += 1
-            if user.failed_login_attempts >= 5:
-                user.locked_until = datetime.utcnow() + timedelta(minutes=15)
+            # Increment failed attempts atomically, so concurrent failures can't
+            # lose an increment; locked_until is assigned first because MySQL
+            # evaluates SET clauses left to right
+            attempts = func.coalesce(User.failed_login_attempts, 0) + 1
+            db.execute(
+                update(User).where(User.id == user.id).ordered_values(
+                    (User.locked_until, case(
+                        (attempts >= MAX_FAILED_LOGIN_ATTEMPTS,
+                         datetime.utcnow() + timedelta(minutes=ACCOUNT_LOCKOUT_MINUTES)),
+                        else_=User.locked_until
+                    )),
+                    (User.failed_login_attempts, attempts)
+                ).execution_options(synchronize_session=False)
+            )
             db.commit()
             
             raise HTTPException(
@@ -126,10 +387,8 @@ class AuthService:
                 detail="Invalid credentials"
             )
         
-        # Check organization status
-        org = db.query(Organization).filter(
-            Organization.id == user.organization_id
-        ).first()
+        # Check organization status (loaded with the user)
+        org = user.organization
         
         if not org.is_active or org.subscription_status == SubscriptionStatus.SUSPENDED:
             raise HTTPException(
@@ -137,29 +396,23 @@ class AuthService:
                 detail="Organization account suspended"
             )
         
+        # Upgrade bcrypt (or outdated argon2) hashes now that we have the plaintext
+        if password_needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+        
         # Reset failed attempts
         user.failed_login_attempts = 0
         user.locked_until = None
         user.last_login_at = datetime.utcnow()
         
-        # Create tokens
+        # Create tokens (stateless; revocation is tracked by jti on logout)
         access_token = AuthService._create_access_token(user)
         refresh_token = AuthService._create_refresh_token(user)
         
-        # Create session
-        session = UserSession(
-            user_id=user.id,
-            token=access_token,
-            refresh_token=refresh_token,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            expires_at=datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
-            refresh_expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-        )
-        db.add(session)
+        db.commit()
         
         # Audit log
-        audit = AuditLog(
+        enqueue_audit(
             organization_id=user.organization_id,
             user_id=user.id,
             action=AuditAction.LOGIN,
@@ -168,9 +421,6 @@ class AuthService:
             ip_address=ip_address,
             user_agent=user_agent
         )
-        db.add(audit)
-        
-        db.commit()
         
         return {
             "access_token": access_token,
@@ -196,9 +446,10 @@ class AuthService:
             "role": user.role.value,
             "exp": datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
             "iat": datetime.utcnow(),
+            "jti": secrets.token_urlsafe(16),
             "type": "access"
         }
-        return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        return jwt.encode(payload, _jwt_signing_key, algorithm=JWT_ALGORITHM, headers={"kid": JWT_KEY_ID})
     
     @staticmethod
     def _create_refresh_token(user):
@@ -207,16 +458,16 @@ class AuthService:
             "sub": str(user.id),
             "exp": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
             "iat": datetime.utcnow(),
+            "jti": secrets.token_urlsafe(16),
             "type": "refresh"
         }
-        return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+        return jwt.encode(payload, _jwt_signing_key, algorithm=JWT_ALGORITHM, headers={"kid": JWT_KEY_ID})
     
     @staticmethod
     def verify_token(token):
         """Verify and decode JWT token"""
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            return payload
+            payload = jwt.decode(token, _jwt_verifying_key, algorithms=[JWT_ALGORITHM])
         except jwt.ExpiredSignatureError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -227,14 +478,39 @@ class AuthService:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
+        
+        if "jti" in payload and _is_jti_revoked(payload["jti"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revoked"
+            )
+        
+        return payload
+    
+    @staticmethod
+    def peek_access_claims(token):
+        """
+        Signature-checked claims of an access token, or None
+        No revocation or user lookup; callers must still authenticate the request
+        """
+        try:
+            payload = jwt.decode(token, _jwt_verifying_key, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
+            return None
+        return payload if payload.get("type") == "access" else None
     
     @staticmethod
     def get_current_user(db, token):
         """Get current user from token"""
         payload = AuthService.verify_token(token)
+        if payload.get("type") != "access":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token type"
+            )
         
         user_id = int(payload.get("sub"))
-        user = db.query(User).filter(
+        user = db.query(User).options(load_only(*_CURRENT_USER_COLUMNS)).filter(
             User.id == user_id,
             User.is_active == True
         ).first()
@@ -248,89 +524,54 @@ class AuthService:
         return user
     
     @staticmethod
-    def logout(db, token):
-        """Logout user and revoke session"""
-        session = db.query(UserSession).filter(
-            UserSession.token == token,
-            UserSession.revoked_at.is_(None)
-        ).first()
+    def logout(db, token, refresh_token=None):
+        """Logout user and revoke the access token and, if given, its refresh token"""
+        try:
+            payload = AuthService.verify_token(token)
+        except HTTPException:
+            return  # Expired, invalid or already revoked: nothing to revoke
+        
+        if payload.get("type") != "access":
+            return
+        
+        if "jti" in payload:
+            _revoke_jti(payload["jti"], payload["exp"])
+        
+        if refresh_token:
+            try:
+                refresh_payload = AuthService.verify_token(refresh_token)
+            except HTTPException:
+                refresh_payload = None
+            # Only the caller's own refresh token can be revoked here
+            if (refresh_payload and refresh_payload.get("type") == "refresh"
+                    and refresh_payload.get("sub") == payload["sub"] and "jti" in refresh_payload):
+                _revoke_jti(refresh_payload["jti"], refresh_payload["exp"])
         
-        if session:
-            session.revoked_at = datetime.utcnow()
-            
-            # Audit log
-            audit = AuditLog(
-                organization_id=session.user.organization_id,
-                user_id=session.user_id,
-                action=AuditAction.LOGOUT,
-                resource_type="user",
-                resource_id=session.user_id
-            )
-            db.add(audit)
-            
-            db.commit()
+        # Audit log
+        user_id = int(payload["sub"])
+        enqueue_audit(
+            organization_id=payload["org_id"],
+            user_id=user_id,
+            action=AuditAction.LOGOUT,
+            resource_type="user",
+            resource_id=user_id
+        )
     
     @staticmethod
     def check_permission(user, resource, action):
         """Check if user has permission for action on resource"""
+        role_str = _ROLE_NAMES.get(user.role) if user.role else "viewer"
         
         # Super admin has all permissions
-        if user.role == UserRole.SUPER_ADMIN or user.role == "super_admin":
+        if role_str == "super_admin":
             return True
         
-        # Define role-based permissions
-        permissions = {
-            "org_admin": {
-                "product": ["create", "read", "update", "delete"],
-                "revision": ["create", "read", "update", "delete", "release"],
-                "bom": ["create", "read", "update", "delete"],
-                "inventory": ["create", "read", "update", "delete"],
-                "shipment": ["create", "read", "update", "delete"],
-                "user": ["create", "read", "update", "delete"],
-                "organization": ["read", "update"],
-                "analytics": ["read"]
-            },
-            "manager": {
-                "product": ["create", "read", "update"],
-                "revision": ["create", "read", "update"],
-                "bom": ["create", "read", "update"],
-                "inventory": ["create", "read", "update"],
-                "shipment": ["create", "read", "update"],
-                "analytics": ["read"]
-            },
-            "user": {
-                "product": ["read"],
-                "revision": ["read"],
-                "bom": ["read"],
-                "inventory": ["read", "update"],
-                "shipment": ["create", "read", "update"],
-                "analytics": ["read"]
-            },
-            "viewer": {
-                "product": ["read"],
-                "revision": ["read"],
-                "bom": ["read"],
-                "inventory": ["read"],
-                "shipment": ["read"],
-                "analytics": ["read"]
-            }
-        }
-        
-        # Normalize role to string for comparison
-        role_str = str(user.role).lower() if user.role else "viewer"
-        if hasattr(user.role, 'value'):
-            role_str = user.role.value
-        
         # Check custom permissions
-        if user.permissions and resource in user.permissions:
-            if action in user.permissions[resource]:
-                return True
+        if user.permissions and action in user.permissions.get(resource, ()):
+            return True
         
         # Check role-based permissions
-        role_perms = permissions.get(role_str, {})
-        resource_perms = role_perms.get(resource, [])
-        
-        return action in resource_perms
+        return action in _ROLE_PERMISSIONS.get(role_str, {}).get(resource, frozenset())
     
     @staticmethod
     def require_permission(user, resource, action):
@@ -348,8 +589,8 @@ class AuthService:
         # Generate key
         tier = user.organization.subscription_tier.value if hasattr(user, 'organization') else 'test'
         raw_key = "sk_{}_{}" .format('live' if tier != 'free' else 'test', secrets.token_urlsafe(32))
-        key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
-        prefix = raw_key[:15]
+        key_hash = _hash_api_key(raw_key)
+        prefix = raw_key[:API_KEY_PREFIX_LENGTH]
         
         # Create API key record
         api_key = ApiKey(
@@ -364,7 +605,6 @@ class AuthService:
         
         db.add(api_key)
         db.commit()
-        db.refresh(api_key)
         
         return api_key, raw_key
     
@@ -372,12 +612,29 @@ class AuthService:
     def verify_api_key(db, raw_key):
         """Verify API key and return user"""
         
-        key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+        key_hash = _hash_api_key(raw_key)
+        legacy_hash = None
         
-        api_key = db.query(ApiKey).filter(
-            ApiKey.key_hash == key_hash,
+        # Look up by the indexed prefix, then compare hashes in constant time
+        api_key = None
+        rehashed = False
+        candidates = db.query(ApiKey).filter(
+            ApiKey.prefix == raw_key[:API_KEY_PREFIX_LENGTH],
             ApiKey.revoked_at.is_(None)
-        ).first()
+        ).all()
+        for candidate in candidates:
+            if hmac.compare_digest(candidate.key_hash, key_hash):
+                api_key = candidate
+                break
+            
+            # Keys issued before the switch carry an unkeyed SHA-256 hash
+            if legacy_hash is None:
+                legacy_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+            if hmac.compare_digest(candidate.key_hash, legacy_hash):
+                candidate.key_hash = key_hash
+                api_key = candidate
+                rehashed = True
+                break
         
         if not api_key:
             raise HTTPException(
@@ -392,9 +649,12 @@ class AuthService:
                 detail="API key expired"
             )
         
-        # Update last used
-        api_key.last_used_at = datetime.utcnow()
-        db.commit()
+        # Update last used (debounced per key)
+        if _should_flush_last_used(api_key.id):
+            api_key.last_used_at = datetime.utcnow()
+            db.commit()
+        elif rehashed:
+            db.commit()
         
         # Get user
         user = db.query(User).filter(User.id == api_key.user_id).first()
@@ -446,8 +706,6 @@ class OrganizationService:
         db.add(admin)
         
         db.commit()
-        db.refresh(org)
-        db.refresh(admin)
         
         return org, admin
     
@@ -3,34 +3,86 @@ Common Data Environment (CDE) - Database Configuration
 Database connection and session management
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import QueuePool
 from contextlib import contextmanager
 from typing import Generator
 import os
+import time
+import json
+
+# orjson serializes JSON columns in C; the stdlib encoder is the fallback
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Prefer mysqlclient (C extension) when installed; it decodes result rows
+# several times faster than pure-Python PyMySQL
+try:
+    import MySQLdb
+    MYSQL_DRIVER = "mysqldb"
+except ImportError:
+    MYSQL_DRIVER = "pymysql"
 
 # Database configuration
 # For XAMPP MariaDB default settings
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
-    "mysql+pymysql://root:@localhost:3306/cde_saas?charset=utf8mb4"
+    f"mysql+{MYSQL_DRIVER}://root:@localhost:3306/cde_saas?charset=utf8mb4"
 )
 
+def _json_serializer(obj) -> str:
+    """Serialize JSON column values; Decimals and other non-JSON types become strings"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=str)
+
+
+def _json_deserializer(value):
+    return orjson.loads(value) if HAS_ORJSON else json.loads(value)
+
+# Pool sizing; override per deployment (e.g. smaller behind a connection proxy)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# MySQL drivers already rewrite executemany INSERTs into multi-row VALUES;
+# psycopg2 needs its fast-execution helpers switched on to do the same
+ENGINE_DIALECT_OPTIONS = {}
+if make_url(DATABASE_URL).get_backend_name() == "postgresql":
+    ENGINE_DIALECT_OPTIONS = {
+        "executemany_mode": "values_plus_batch",
+        "executemany_values_page_size": 1000,
+        "executemany_batch_page_size": 500,
+    }
+
 # Create engine with connection pooling
 engine = create_engine(
     DATABASE_URL,
     poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=DB_POOL_SIZE,  # Room for the dashboard's concurrent workers
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=10,  # Fail fast instead of queueing for 30s on checkout
+    pool_recycle=DB_POOL_RECYCLE,  # Retire connections before MariaDB's wait_timeout
+    pool_use_lifo=True,  # Reuse warm connections; idle extras age out
     pool_pre_ping=True,  # Verify connections before using
+    connect_args={"connect_timeout": 5},
+    query_cache_size=1200,  # Compiled statement cache (default 500)
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
     echo=False,  # Set to True for SQL query logging
+    **ENGINE_DIALECT_OPTIONS
 )
 
 # Session factory
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
+    expire_on_commit=False,  # Committed objects keep their values; no re-SELECT on access
     bind=engine
 )
 
@@ -63,6 +115,22 @@ def get_db_context():
     finally:
         db.close()
 
+@contextmanager
+def unit_of_work(db: Session):
+    """
+    Run several service calls (with commit=False) as one transaction
+    Usage:
+        with unit_of_work(db):
+            PLMService.release_revision(db, revision_id, commit=False)
+            PLMService.update_product(db, product_id, data, commit=False)
+    """
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
 def init_db():
     """
     Initialize database tables
@@ -71,13 +139,22 @@ def init_db():
     from models import Base
     Base.metadata.create_all(bind=engine)
 
+# A successful check is reused briefly so frequent health probes don't each hit the database
+HEALTH_CHECK_TTL_SECONDS = 2
+_last_db_ok = 0.0
+
 def check_db_connection() -> bool:
     """
     Check if database connection is working
     """
+    global _last_db_ok
+    if time.monotonic() - _last_db_ok < HEALTH_CHECK_TTL_SECONDS:
+        return True
+    
     try:
         with engine.connect() as conn:
-            conn.execute("SELECT 1")
+            conn.execute(text("SELECT 1"))
+        _last_db_ok = time.monotonic()
         return True
     except Exception as e:
         print(f"Database connection failed: {e}")
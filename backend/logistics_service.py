@@ -3,18 +3,80 @@ Common Data Environment (CDE) - Logistics Service
 Business logic for Logistics domain (Inventory & Shipments)
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, lambda_stmt, tuple_
+from sqlalchemy.orm import Session, raiseload, selectinload
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional, Dict
+from typing import Any, Iterator, List, Optional, Dict
+from dataclasses import dataclass
 from datetime import datetime, date
 from decimal import Decimal
 
 from database.saas_models_py37 import (
     Product, InventoryBalance, InventoryTransaction, Shipment, ShipmentLine, ShipmentEvent,
-    TransactionType, ShipmentStatus, ShipmentEventType
+    TransactionType, ShipmentStatus, ShipmentEventType, record_bulk_insert
 )
 from database import schemas
 
+# Rows per fetch when streaming transaction history
+TRANSACTION_STREAM_BATCH_SIZE = 500
+
+
+# ============================================================================
+# Balance handlers: (on_hand, reserved, quantity) -> (on_hand, reserved)
+# ============================================================================
+
+def _receipt(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    return on_hand + quantity, reserved
+
+
+def _issue(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    if on_hand < quantity:
+        raise ValueError(f"Insufficient quantity. Available: {on_hand}, Requested: {quantity}")
+    return on_hand - quantity, reserved
+
+
+def _adjustment(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    return quantity, reserved
+
+
+def _transfer_out(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    if on_hand < quantity:
+        raise ValueError(f"Insufficient quantity for transfer")
+    return on_hand - quantity, reserved
+
+
+def _reservation(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    available = on_hand - reserved
+    if available < quantity:
+        raise ValueError(f"Insufficient available quantity. Available: {available}, Requested: {quantity}")
+    return on_hand, reserved + quantity
+
+
+def _release_reservation(on_hand: Decimal, reserved: Decimal, quantity: Decimal):
+    if reserved < quantity:
+        raise ValueError(f"Cannot release more than reserved")
+    return on_hand, reserved - quantity
+
+
+# Keyed by the API enum, which is what InventoryTransactionCreate carries
+_TXN_HANDLERS = {
+    schemas.TransactionTypeEnum.RECEIPT: _receipt,
+    schemas.TransactionTypeEnum.ISSUE: _issue,
+    schemas.TransactionTypeEnum.ADJUSTMENT: _adjustment,
+    schemas.TransactionTypeEnum.TRANSFER_OUT: _transfer_out,
+    schemas.TransactionTypeEnum.TRANSFER_IN: _receipt,
+    schemas.TransactionTypeEnum.RESERVATION: _reservation,
+    schemas.TransactionTypeEnum.RELEASE_RESERVATION: _release_reservation,
+}
+
+
+@dataclass
+class ShipmentOp:
+    """One step of a batched shipment workflow for LogisticsService.process_batch"""
+    action: str  # create | confirm | pick | pack | ship
+    shipment_id: Optional[int] = None
+    data: Any = None
+
 
 class LogisticsService:
     """Service layer for Logistics operations with event sourcing"""
@@ -25,16 +87,18 @@ class LogisticsService:
     
     @staticmethod
     def get_or_create_balance(db: Session, product_id: int, location_code: str) -> InventoryBalance:
-        """Get existing balance or create new one"""
+        """
+        Get existing balance or create new one.
+        The row is locked FOR UPDATE until the caller's transaction ends.
+        """
         balance = db.query(InventoryBalance).filter(
             InventoryBalance.product_id == product_id,
             InventoryBalance.location_code == location_code
-        ).first()
+        ).with_for_update().first()
         
         if not balance:
             # Verify product exists
-            product = db.query(Product).filter(Product.id == product_id).first()
-            if not product:
+            if not db.query(db.query(Product.id).filter(Product.id == product_id).exists()).scalar():
                 raise ValueError(f"Product {product_id} not found")
             
             balance = InventoryBalance(
@@ -49,106 +113,227 @@ class LogisticsService:
         return balance
     
     @staticmethod
-    def create_transaction(db: Session, txn_data: schemas.InventoryTransactionCreate) -> InventoryTransaction:
+    def _apply_transaction(db: Session, txn_data: schemas.InventoryTransactionCreate,
+                           balance: Optional[InventoryBalance] = None,
+                           now: Optional[datetime] = None) -> InventoryTransaction:
         """
-        Create inventory transaction with balance update
-        Transaction: Insert event + Update state
+        Stage a balance update and its transaction event without committing.
+        The caller owns the surrounding transaction and may pass a preloaded
+        balance and the operation's timestamp.
         """
-        try:
-            # Get or create balance
+        if balance is None:
             balance = LogisticsService.get_or_create_balance(
                 db, txn_data.product_id, txn_data.location_code
             )
-            
-            # Calculate new balance based on transaction type
-            old_on_hand = balance.quantity_on_hand
-            old_reserved = balance.quantity_reserved
-            
-            if txn_data.transaction_type == TransactionType.RECEIPT:
-                balance.quantity_on_hand += txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.ISSUE:
-                if balance.quantity_on_hand < txn_data.quantity:
-                    raise ValueError(f"Insufficient quantity. Available: {balance.quantity_on_hand}, Requested: {txn_data.quantity}")
-                balance.quantity_on_hand -= txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.ADJUSTMENT:
-                balance.quantity_on_hand = txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.TRANSFER_OUT:
-                if balance.quantity_on_hand < txn_data.quantity:
-                    raise ValueError(f"Insufficient quantity for transfer")
-                balance.quantity_on_hand -= txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.TRANSFER_IN:
-                balance.quantity_on_hand += txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.RESERVATION:
-                available = balance.quantity_on_hand - balance.quantity_reserved
-                if available < txn_data.quantity:
-                    raise ValueError(f"Insufficient available quantity. Available: {available}, Requested: {txn_data.quantity}")
-                balance.quantity_reserved += txn_data.quantity
-            elif txn_data.transaction_type == TransactionType.RELEASE_RESERVATION:
-                if balance.quantity_reserved < txn_data.quantity:
-                    raise ValueError(f"Cannot release more than reserved")
-                balance.quantity_reserved -= txn_data.quantity
-            
-            balance.last_transaction_at = datetime.utcnow()
-            
-            # Create transaction event
-            transaction = InventoryTransaction(
-                product_id=txn_data.product_id,
-                location_code=txn_data.location_code,
-                transaction_type=txn_data.transaction_type,
-                quantity=txn_data.quantity,
-                unit=txn_data.unit,
-                reference_type=txn_data.reference_type,
-                reference_id=txn_data.reference_id,
-                notes=txn_data.notes,
-                balance_after=balance.quantity_on_hand
+        
+        # Calculate new balance based on transaction type
+        handler = _TXN_HANDLERS.get(txn_data.transaction_type)
+        if handler:
+            balance.quantity_on_hand, balance.quantity_reserved = handler(
+                balance.quantity_on_hand, balance.quantity_reserved, txn_data.quantity
             )
-            db.add(transaction)
-            
+        
+        balance.last_transaction_at = now or datetime.utcnow()
+        
+        # Create transaction event
+        transaction = InventoryTransaction(
+            product_id=txn_data.product_id,
+            location_code=txn_data.location_code,
+            transaction_type=txn_data.transaction_type,
+            quantity=txn_data.quantity,
+            unit=txn_data.unit,
+            reference_type=txn_data.reference_type,
+            reference_id=txn_data.reference_id,
+            notes=txn_data.notes,
+            balance_after=balance.quantity_on_hand
+        )
+        db.add(transaction)
+        return transaction
+    
+    @staticmethod
+    def _lock_balances(db: Session, product_ids, location_code: str) -> Dict[int, InventoryBalance]:
+        """
+        Load and lock the balances for a set of products at one location,
+        creating any that are missing. Returns balances keyed by product id.
+        """
+        product_ids = set(product_ids)
+        balances = {
+            balance.product_id: balance
+            for balance in db.query(InventoryBalance).filter(
+                InventoryBalance.product_id.in_(product_ids),
+                InventoryBalance.location_code == location_code
+            ).with_for_update().all()
+        }
+        
+        missing = product_ids - balances.keys()
+        if missing:
+            # Added through the ORM so the balance roll-up listeners still fire
+            for product_id in missing:
+                balances[product_id] = InventoryBalance(
+                    product_id=product_id,
+                    location_code=location_code,
+                    quantity_on_hand=Decimal('0'),
+                    quantity_reserved=Decimal('0')
+                )
+            db.add_all([balances[product_id] for product_id in missing])
+            db.flush()
+        
+        return balances
+    
+    @staticmethod
+    def _bulk_insert(db: Session, model, rows: List[dict]) -> Optional[List[int]]:
+        """
+        Insert rows in one executemany and return their ids when the dialect
+        supports RETURNING for executemany; MySQL does not, so None there.
+        Mapper events do not fire for Core inserts, so the model's bulk-insert
+        handlers run here in their place.
+        """
+        table = model.__table__
+        ids = None
+        if db.get_bind().dialect.insert_executemany_returning:
+            result = db.execute(table.insert().returning(table.c.id), rows)
+            ids = [row[0] for row in result]
+        else:
+            db.execute(table.insert(), rows)
+        record_bulk_insert(db.connection(), model, rows)
+        return ids
+    
+    @staticmethod
+    def create_transaction(db: Session, txn_data: schemas.InventoryTransactionCreate) -> InventoryTransaction:
+        """
+        Create inventory transaction with balance update
+        Transaction: Insert event + Update state
+        The balance row stays locked until the commit, so concurrent issues
+        cannot both pass the availability check.
+        """
+        try:
+            transaction = LogisticsService._apply_transaction(db, txn_data)
             db.commit()
-            db.refresh(transaction)
-            db.refresh(balance)
             return transaction
             
-        except Exception as e:
+        except Exception:
             db.rollback()
             raise
     
     @staticmethod
     def get_balance(db: Session, product_id: int, location_code: str) -> Optional[InventoryBalance]:
         """Get inventory balance for product at location"""
-        return db.query(InventoryBalance).filter(
+        stmt = lambda_stmt(lambda: select(InventoryBalance).where(
             InventoryBalance.product_id == product_id,
             InventoryBalance.location_code == location_code
-        ).first()
+        ))
+        return db.execute(stmt).scalars().first()
     
     @staticmethod
     def list_balances(db: Session, product_id: Optional[int] = None, 
                      location_code: Optional[str] = None,
                      skip: int = 0, limit: int = 100) -> List[InventoryBalance]:
         """List inventory balances with optional filtering"""
-        query = db.query(InventoryBalance)
+        stmt = lambda_stmt(lambda: select(InventoryBalance))
         if product_id:
-            query = query.filter(InventoryBalance.product_id == product_id)
+            stmt += lambda s: s.where(InventoryBalance.product_id == product_id)
         if location_code:
-            query = query.filter(InventoryBalance.location_code == location_code)
-        return query.offset(skip).limit(limit).all()
+            stmt += lambda s: s.where(InventoryBalance.location_code == location_code)
+        stmt += lambda s: s.offset(skip).limit(limit)
+        return db.execute(stmt).scalars().all()
     
     @staticmethod
     def get_transactions(db: Session, product_id: Optional[int] = None,
                         location_code: Optional[str] = None,
-                        skip: int = 0, limit: int = 100) -> List[InventoryTransaction]:
-        """Get transaction history with optional filtering"""
+                        after_created_at: Optional[datetime] = None,
+                        after_id: Optional[int] = None,
+                        limit: int = 100) -> List[InventoryTransaction]:
+        """
+        Get transaction history with optional filtering, newest first.
+        Pass the created_at/id of the last row seen to fetch the next page.
+        """
+        stmt = lambda_stmt(lambda: select(InventoryTransaction))
+        if product_id:
+            stmt += lambda s: s.where(InventoryTransaction.product_id == product_id)
+        if location_code:
+            stmt += lambda s: s.where(InventoryTransaction.location_code == location_code)
+        if after_created_at is not None and after_id is not None:
+            stmt += lambda s: s.where(
+                tuple_(InventoryTransaction.created_at, InventoryTransaction.id) < tuple_(after_created_at, after_id)
+            )
+        stmt += lambda s: s.order_by(
+            InventoryTransaction.created_at.desc(), InventoryTransaction.id.desc()
+        ).limit(limit)
+        return db.execute(stmt).scalars().all()
+    
+    @staticmethod
+    def get_transactions_stream(db: Session, product_id: Optional[int] = None,
+                                location_code: Optional[str] = None) -> Iterator[InventoryTransaction]:
+        """
+        Iterate the full transaction history, newest first, for exports and reports.
+        Rows are fetched from a server-side cursor in batches of TRANSACTION_STREAM_BATCH_SIZE.
+        """
         query = db.query(InventoryTransaction)
         if product_id:
             query = query.filter(InventoryTransaction.product_id == product_id)
         if location_code:
             query = query.filter(InventoryTransaction.location_code == location_code)
-        return query.order_by(InventoryTransaction.created_at.desc()).offset(skip).limit(limit).all()
+        query = query.order_by(InventoryTransaction.created_at.desc(), InventoryTransaction.id.desc())
+        for transaction in query.yield_per(TRANSACTION_STREAM_BATCH_SIZE):
+            yield transaction
     
     # ========================================================================
     # Shipment Operations
     # ========================================================================
     
+    @staticmethod
+    def _create_shipment(db: Session, shipment_data: schemas.ShipmentCreate) -> Shipment:
+        """Stage a new shipment with its lines and CREATED event without committing"""
+        # Verify all products exist with one lookup
+        product_ids = {line_data.product_id for line_data in shipment_data.lines}
+        found = {pid for (pid,) in db.query(Product.id).filter(Product.id.in_(product_ids))}
+        missing = product_ids - found
+        if missing:
+            raise ValueError(f"Products not found: {', '.join(str(pid) for pid in sorted(missing))}")
+        
+        # Create shipment state
+        shipment = Shipment(
+            shipment_number=shipment_data.shipment_number,
+            status=ShipmentStatus.DRAFT,
+            from_location=shipment_data.from_location,
+            to_location=shipment_data.to_location,
+            destination_address=shipment_data.destination_address,
+            carrier=shipment_data.carrier,
+            tracking_number=shipment_data.tracking_number,
+            planned_ship_date=shipment_data.planned_ship_date,
+            notes=shipment_data.notes
+        )
+        db.add(shipment)
+        db.flush()
+        
+        # Create shipment lines in one executemany; Core inserts take only
+        # real columns, so the planned quantity is stored as quantity_ordered
+        rows = [
+            {
+                "shipment_id": shipment.id,
+                "product_id": line_data.product_id,
+                "quantity_ordered": line_data.quantity_planned,
+                "notes": line_data.notes
+            }
+            for line_data in shipment_data.lines
+        ]
+        if rows:
+            LogisticsService._bulk_insert(db, ShipmentLine, rows)
+        
+        # Create shipment event
+        event = ShipmentEvent(
+            shipment_id=shipment.id,
+            event_type=ShipmentEventType.CREATED,
+            event_data={
+                "shipment_number": shipment_data.shipment_number,
+                "from_location": shipment_data.from_location,
+                "to_location": shipment_data.to_location,
+                "line_count": len(shipment_data.lines)
+            }
+        )
+        db.add(event)
+        return shipment
+    
     @staticmethod
     def create_shipment(db: Session, shipment_data: schemas.ShipmentCreate) -> Shipment:
         """
@@ -156,61 +341,71 @@ class LogisticsService:
         Transaction: Insert event + Insert state (shipment + lines)
         """
         try:
-            # Create shipment state
-            shipment = Shipment(
-                shipment_number=shipment_data.shipment_number,
-                status=ShipmentStatus.DRAFT,
-                from_location=shipment_data.from_location,
-                to_location=shipment_data.to_location,
-                destination_address=shipment_data.destination_address,
-                carrier=shipment_data.carrier,
-                tracking_number=shipment_data.tracking_number,
-                planned_ship_date=shipment_data.planned_ship_date,
-                notes=shipment_data.notes
-            )
-            db.add(shipment)
-            db.flush()
-            
-            # Create shipment lines
-            for line_data in shipment_data.lines:
-                # Verify product exists
-                product = db.query(Product).filter(Product.id == line_data.product_id).first()
-                if not product:
-                    raise ValueError(f"Product {line_data.product_id} not found")
-                
-                line = ShipmentLine(
-                    shipment_id=shipment.id,
-                    product_id=line_data.product_id,
-                    quantity_planned=line_data.quantity_planned,
-                    unit=line_data.unit,
-                    notes=line_data.notes
-                )
-                db.add(line)
-            
-            # Create shipment event
-            event = ShipmentEvent(
-                shipment_id=shipment.id,
-                event_type=ShipmentEventType.CREATED,
-                event_data={
-                    "shipment_number": shipment_data.shipment_number,
-                    "from_location": shipment_data.from_location,
-                    "to_location": shipment_data.to_location,
-                    "line_count": len(shipment_data.lines)
-                }
-            )
-            db.add(event)
-            
+            shipment = LogisticsService._create_shipment(db, shipment_data)
             db.commit()
-            db.refresh(shipment)
             return shipment
             
         except IntegrityError:
             db.rollback()
             raise ValueError(f"Shipment {shipment_data.shipment_number} already exists")
-        except Exception as e:
+        except Exception:
             db.rollback()
             raise
     
+    @staticmethod
+    def _lock_shipment(db: Session, shipment_id: int) -> Shipment:
+        """
+        Load a shipment with its row locked FOR UPDATE so transitions on the
+        same shipment serialize; the lock is released on commit/rollback.
+        """
+        shipment = db.query(Shipment).filter(Shipment.id == shipment_id).with_for_update().first()
+        if not shipment:
+            raise ValueError(f"Shipment {shipment_id} not found")
+        return shipment
+    
+    @staticmethod
+    def _confirm_shipment(db: Session, shipment_id: int) -> Shipment:
+        """Stage confirmation and inventory reservations without committing"""
+        shipment = LogisticsService._lock_shipment(db, shipment_id)
+        
+        if shipment.status != ShipmentStatus.DRAFT:
+            raise ValueError(f"Can only confirm draft shipments. Current status: {shipment.status}")
+        
+        # Reserve inventory for each line
+        now = datetime.utcnow()
+        lines = db.query(ShipmentLine).filter(ShipmentLine.shipment_id == shipment_id).all()
+        balances = LogisticsService._lock_balances(
+            db, [line.product_id for line in lines], shipment.from_location
+        )
+        for line in lines:
+            # Create reservation transaction
+            reservation_txn = schemas.InventoryTransactionCreate(
+                product_id=line.product_id,
+                location_code=shipment.from_location,
+                transaction_type=TransactionType.RESERVATION,
+                quantity=line.quantity_planned,
+                unit=line.unit,
+                reference_type="shipment",
+                reference_id=shipment.id,
+                notes=f"Reserved for shipment {shipment.shipment_number}"
+            )
+            LogisticsService._apply_transaction(db, reservation_txn, balances[line.product_id], now)
+        
+        # Update shipment status
+        shipment.status = ShipmentStatus.CONFIRMED
+        
+        # Create event
+        event = ShipmentEvent(
+            shipment_id=shipment.id,
+            event_type=ShipmentEventType.CONFIRMED,
+            event_data={
+                "confirmed_at": now.isoformat(),
+                "line_count": len(lines)
+            }
+        )
+        db.add(event)
+        return shipment
+    
     @staticmethod
     def confirm_shipment(db: Session, shipment_id: int) -> Shipment:
         """
@@ -218,51 +413,58 @@ class LogisticsService:
         Transaction: Insert event + Update state + Create inventory reservations
         """
         try:
-            shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
-            if not shipment:
-                raise ValueError(f"Shipment {shipment_id} not found")
-            
-            if shipment.status != ShipmentStatus.DRAFT:
-                raise ValueError(f"Can only confirm draft shipments. Current status: {shipment.status}")
-            
-            # Reserve inventory for each line
-            lines = db.query(ShipmentLine).filter(ShipmentLine.shipment_id == shipment_id).all()
-            for line in lines:
-                # Create reservation transaction
-                reservation_txn = schemas.InventoryTransactionCreate(
-                    product_id=line.product_id,
-                    location_code=shipment.from_location,
-                    transaction_type=TransactionType.RESERVATION,
-                    quantity=line.quantity_planned,
-                    unit=line.unit,
-                    reference_type="shipment",
-                    reference_id=shipment.id,
-                    notes=f"Reserved for shipment {shipment.shipment_number}"
-                )
-                LogisticsService.create_transaction(db, reservation_txn)
-            
-            # Update shipment status
-            shipment.status = ShipmentStatus.CONFIRMED
-            
-            # Create event
-            event = ShipmentEvent(
-                shipment_id=shipment.id,
-                event_type=ShipmentEventType.CONFIRMED,
-                event_data={
-                    "confirmed_at": datetime.utcnow().isoformat(),
-                    "line_count": len(lines)
-                }
-            )
-            db.add(event)
-            
+            shipment = LogisticsService._confirm_shipment(db, shipment_id)
             db.commit()
-            db.refresh(shipment)
             return shipment
             
-        except Exception as e:
+        except Exception:
             db.rollback()
             raise
     
+    @staticmethod
+    def _get_lines_by_id(db: Session, shipment_id: int, line_ids) -> Dict[int, ShipmentLine]:
+        """Load the given lines of a shipment in one query, keyed by line id"""
+        lines = db.query(ShipmentLine).filter(
+            ShipmentLine.id.in_(list(line_ids)),
+            ShipmentLine.shipment_id == shipment_id
+        ).all()
+        return {line.id: line for line in lines}
+    
+    @staticmethod
+    def _pick_shipment(db: Session, shipment_id: int, pick_data: schemas.ShipmentPick) -> Shipment:
+        """Stage picked quantities without committing"""
+        shipment = LogisticsService._lock_shipment(db, shipment_id)
+        
+        if shipment.status != ShipmentStatus.CONFIRMED:
+            raise ValueError(f"Can only pick confirmed shipments. Current status: {shipment.status}")
+        
+        # Update line quantities
+        lines = LogisticsService._get_lines_by_id(db, shipment_id, pick_data.line_quantities.keys())
+        for line_id, quantity in pick_data.line_quantities.items():
+            line = lines.get(line_id)
+            if not line:
+                raise ValueError(f"Line {line_id} not found in shipment")
+            
+            if quantity > line.quantity_planned:
+                raise ValueError(f"Cannot pick more than planned quantity for line {line_id}")
+            
+            line.quantity_picked = quantity
+        
+        # Update shipment status
+        shipment.status = ShipmentStatus.PICKED
+        
+        # Create event
+        event = ShipmentEvent(
+            shipment_id=shipment.id,
+            event_type=ShipmentEventType.PICKED,
+            event_data={
+                "picked_at": datetime.utcnow().isoformat(),
+                "quantities": pick_data.line_quantities
+            }
+        )
+        db.add(event)
+        return shipment
+    
     @staticmethod
     def pick_shipment(db: Session, shipment_id: int, pick_data: schemas.ShipmentPick) -> Shipment:
         """
@@ -270,46 +472,49 @@ class LogisticsService:
         Transaction: Insert event + Update state (shipment + lines)
         """
         try:
-            shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
-            if not shipment:
-                raise ValueError(f"Shipment {shipment_id} not found")
-            
-            if shipment.status != ShipmentStatus.CONFIRMED:
-                raise ValueError(f"Can only pick confirmed shipments. Current status: {shipment.status}")
-            
-            # Update line quantities
-            for line_id, quantity in pick_data.line_quantities.items():
-                line = db.query(ShipmentLine).filter(ShipmentLine.id == line_id).first()
-                if not line or line.shipment_id != shipment_id:
-                    raise ValueError(f"Line {line_id} not found in shipment")
-                
-                if quantity > line.quantity_planned:
-                    raise ValueError(f"Cannot pick more than planned quantity for line {line_id}")
-                
-                line.quantity_picked = quantity
-            
-            # Update shipment status
-            shipment.status = ShipmentStatus.PICKED
-            
-            # Create event
-            event = ShipmentEvent(
-                shipment_id=shipment.id,
-                event_type=ShipmentEventType.PICKED,
-                event_data={
-                    "picked_at": datetime.utcnow().isoformat(),
-                    "quantities": {str(k): str(v) for k, v in pick_data.line_quantities.items()}
-                }
-            )
-            db.add(event)
-            
+            shipment = LogisticsService._pick_shipment(db, shipment_id, pick_data)
             db.commit()
-            db.refresh(shipment)
             return shipment
             
-        except Exception as e:
+        except Exception:
             db.rollback()
             raise
     
+    @staticmethod
+    def _pack_shipment(db: Session, shipment_id: int, pack_data: schemas.ShipmentPack) -> Shipment:
+        """Stage packed quantities without committing"""
+        shipment = LogisticsService._lock_shipment(db, shipment_id)
+        
+        if shipment.status != ShipmentStatus.PICKED:
+            raise ValueError(f"Can only pack picked shipments. Current status: {shipment.status}")
+        
+        # Update line quantities
+        lines = LogisticsService._get_lines_by_id(db, shipment_id, pack_data.line_quantities.keys())
+        for line_id, quantity in pack_data.line_quantities.items():
+            line = lines.get(line_id)
+            if not line:
+                raise ValueError(f"Line {line_id} not found in shipment")
+            
+            if quantity > line.quantity_picked:
+                raise ValueError(f"Cannot pack more than picked quantity for line {line_id}")
+            
+            line.quantity_packed = quantity
+        
+        # Update shipment status
+        shipment.status = ShipmentStatus.PACKED
+        
+        # Create event
+        event = ShipmentEvent(
+            shipment_id=shipment.id,
+            event_type=ShipmentEventType.PACKED,
+            event_data={
+                "packed_at": datetime.utcnow().isoformat(),
+                "quantities": pack_data.line_quantities
+            }
+        )
+        db.add(event)
+        return shipment
+    
     @staticmethod
     def pack_shipment(db: Session, shipment_id: int, pack_data: schemas.ShipmentPack) -> Shipment:
         """
@@ -317,46 +522,89 @@ class LogisticsService:
         Transaction: Insert event + Update state (shipment + lines)
         """
         try:
-            shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
-            if not shipment:
-                raise ValueError(f"Shipment {shipment_id} not found")
-            
-            if shipment.status != ShipmentStatus.PICKED:
-                raise ValueError(f"Can only pack picked shipments. Current status: {shipment.status}")
-            
-            # Update line quantities
-            for line_id, quantity in pack_data.line_quantities.items():
-                line = db.query(ShipmentLine).filter(ShipmentLine.id == line_id).first()
-                if not line or line.shipment_id != shipment_id:
-                    raise ValueError(f"Line {line_id} not found in shipment")
-                
-                if quantity > line.quantity_picked:
-                    raise ValueError(f"Cannot pack more than picked quantity for line {line_id}")
-                
-                line.quantity_packed = quantity
-            
-            # Update shipment status
-            shipment.status = ShipmentStatus.PACKED
-            
-            # Create event
-            event = ShipmentEvent(
-                shipment_id=shipment.id,
-                event_type=ShipmentEventType.PACKED,
-                event_data={
-                    "packed_at": datetime.utcnow().isoformat(),
-                    "quantities": {str(k): str(v) for k, v in pack_data.line_quantities.items()}
-                }
-            )
-            db.add(event)
-            
+            shipment = LogisticsService._pack_shipment(db, shipment_id, pack_data)
             db.commit()
-            db.refresh(shipment)
             return shipment
             
-        except Exception as e:
+        except Exception:
             db.rollback()
             raise
     
+    @staticmethod
+    def _ship_shipment(db: Session, shipment_id: int, ship_data: schemas.ShipmentShip) -> Shipment:
+        """Stage shipping, inventory issues and reservation releases without committing"""
+        shipment = LogisticsService._lock_shipment(db, shipment_id)
+        
+        if shipment.status != ShipmentStatus.PACKED:
+            raise ValueError(f"Can only ship packed shipments. Current status: {shipment.status}")
+        
+        # Issue inventory and release reservations for each line
+        lines = db.query(ShipmentLine).filter(ShipmentLine.shipment_id == shipment_id).all()
+        balances = LogisticsService._lock_balances(
+            db, [line.product_id for line in lines], shipment.from_location
+        )
+        now = datetime.utcnow()
+        txn_rows = []
+        for line in lines:
+            # One balance mutation per line: issue the packed quantity and
+            # release the whole reservation
+            balance = balances[line.product_id]
+            if balance.quantity_on_hand < line.quantity_packed:
+                raise ValueError(f"Insufficient quantity. Available: {balance.quantity_on_hand}, Requested: {line.quantity_packed}")
+            if balance.quantity_reserved < line.quantity_ordered:
+                raise ValueError(f"Cannot release more than reserved")
+            balance.quantity_on_hand -= line.quantity_packed
+            balance.quantity_reserved -= line.quantity_ordered
+            balance.last_transaction_at = now
+            
+            event_row = {
+                "product_id": line.product_id,
+                "location_code": shipment.from_location,
+                "reference_type": "shipment",
+                "reference_id": shipment.id,
+                "balance_after": balance.quantity_on_hand,
+                "created_at": now
+            }
+            if line.quantity_packed > 0:
+                txn_rows.append(dict(
+                    event_row, transaction_type=TransactionType.ISSUE, quantity=line.quantity_packed,
+                    notes=f"Issued for shipment {shipment.shipment_number}"
+                ))
+            if line.quantity_ordered > 0:
+                txn_rows.append(dict(
+                    event_row, transaction_type=TransactionType.RELEASE_RESERVATION, quantity=line.quantity_ordered,
+                    notes=f"Released reservation for shipment {shipment.shipment_number}"
+                ))
+        
+        # Balance changes flush through the ORM so the roll-up listeners run;
+        # the ISSUE/RELEASE events go in one executemany, whose bulk-insert
+        # handlers keep total_outbound and the analytics data version current
+        txn_ids = LogisticsService._bulk_insert(db, InventoryTransaction, txn_rows) if txn_rows else None
+        
+        # Update shipment
+        shipment.status = ShipmentStatus.SHIPPED
+        shipment.actual_ship_date = ship_data.actual_ship_date
+        if ship_data.carrier:
+            shipment.carrier = ship_data.carrier
+        if ship_data.tracking_number:
+            shipment.tracking_number = ship_data.tracking_number
+        
+        # Create event
+        event = ShipmentEvent(
+            shipment_id=shipment.id,
+            event_type=ShipmentEventType.SHIPPED,
+            event_data={
+                "shipped_at": now.isoformat(),
+                "actual_ship_date": ship_data.actual_ship_date.isoformat(),
+                "carrier": ship_data.carrier,
+                "tracking_number": ship_data.tracking_number
+            }
+        )
+        if txn_ids:
+            event.event_data["transaction_ids"] = txn_ids
+        db.add(event)
+        return shipment
+    
     @staticmethod
     def ship_shipment(db: Session, shipment_id: int, ship_data: schemas.ShipmentShip) -> Shipment:
         """
@@ -364,90 +612,77 @@ class LogisticsService:
         Transaction: Insert event + Update state + Create inventory issues + Release reservations
         """
         try:
-            shipment = db.query(Shipment).filter(Shipment.id == shipment_id).first()
-            if not shipment:
-                raise ValueError(f"Shipment {shipment_id} not found")
-            
-            if shipment.status != ShipmentStatus.PACKED:
-                raise ValueError(f"Can only ship packed shipments. Current status: {shipment.status}")
-            
-            # Issue inventory and release reservations for each line
-            lines = db.query(ShipmentLine).filter(ShipmentLine.shipment_id == shipment_id).all()
-            for line in lines:
-                # Issue the packed quantity
-                if line.quantity_packed > 0:
-                    issue_txn = schemas.InventoryTransactionCreate(
-                        product_id=line.product_id,
-                        location_code=shipment.from_location,
-                        transaction_type=TransactionType.ISSUE,
-                        quantity=line.quantity_packed,
-                        unit=line.unit,
-                        reference_type="shipment",
-                        reference_id=shipment.id,
-                        notes=f"Issued for shipment {shipment.shipment_number}"
-                    )
-                    LogisticsService.create_transaction(db, issue_txn)
-                
-                # Release reservation
-                release_txn = schemas.InventoryTransactionCreate(
-                    product_id=line.product_id,
-                    location_code=shipment.from_location,
-                    transaction_type=TransactionType.RELEASE_RESERVATION,
-                    quantity=line.quantity_planned,
-                    unit=line.unit,
-                    reference_type="shipment",
-                    reference_id=shipment.id,
-                    notes=f"Released reservation for shipment {shipment.shipment_number}"
-                )
-                LogisticsService.create_transaction(db, release_txn)
-            
-            # Update shipment
-            shipment.status = ShipmentStatus.SHIPPED
-            shipment.actual_ship_date = ship_data.actual_ship_date
-            if ship_data.carrier:
-                shipment.carrier = ship_data.carrier
-            if ship_data.tracking_number:
-                shipment.tracking_number = ship_data.tracking_number
-            
-            # Create event
-            event = ShipmentEvent(
-                shipment_id=shipment.id,
-                event_type=ShipmentEventType.SHIPPED,
-                event_data={
-                    "shipped_at": datetime.utcnow().isoformat(),
-                    "actual_ship_date": ship_data.actual_ship_date.isoformat(),
-                    "carrier": ship_data.carrier,
-                    "tracking_number": ship_data.tracking_number
-                }
-            )
-            db.add(event)
-            
+            shipment = LogisticsService._ship_shipment(db, shipment_id, ship_data)
             db.commit()
-            db.refresh(shipment)
             return shipment
             
-        except Exception as e:
+        except Exception:
+            db.rollback()
+            raise
+    
+    @staticmethod
+    def process_batch(db: Session, ops: List[ShipmentOp]) -> List[Shipment]:
+        """
+        Apply a wave of shipment transitions under a single commit.
+        Any failing op rolls back the whole batch.
+        """
+        steps = {
+            "create": lambda op: LogisticsService._create_shipment(db, op.data),
+            "confirm": lambda op: LogisticsService._confirm_shipment(db, op.shipment_id),
+            "pick": lambda op: LogisticsService._pick_shipment(db, op.shipment_id, op.data),
+            "pack": lambda op: LogisticsService._pack_shipment(db, op.shipment_id, op.data),
+            "ship": lambda op: LogisticsService._ship_shipment(db, op.shipment_id, op.data),
+        }
+        try:
+            shipments = []
+            for op in ops:
+                if op.action not in steps:
+                    raise ValueError(f"Unknown shipment operation: {op.action}")
+                shipments.append(steps[op.action](op))
+                # Later ops may look up rows staged by earlier ones
+                db.flush()
+            db.commit()
+            return shipments
+            
+        except Exception:
             db.rollback()
             raise
     
     @staticmethod
     def get_shipment(db: Session, shipment_id: int) -> Optional[Shipment]:
         """Get shipment by ID with lines"""
-        return db.query(Shipment).filter(Shipment.id == shipment_id).first()
+        return db.query(Shipment).options(
+            selectinload(Shipment.lines), selectinload(Shipment.events)
+        ).filter(Shipment.id == shipment_id).first()
     
     @staticmethod
     def get_shipment_by_number(db: Session, shipment_number: str) -> Optional[Shipment]:
         """Get shipment by number"""
-        return db.query(Shipment).filter(Shipment.shipment_number == shipment_number).first()
+        stmt = lambda_stmt(lambda: select(Shipment).options(
+            selectinload(Shipment.lines), selectinload(Shipment.events)
+        ).where(Shipment.shipment_number == shipment_number))
+        return db.execute(stmt).scalars().first()
     
     @staticmethod
     def list_shipments(db: Session, status: Optional[ShipmentStatus] = None,
                       from_location: Optional[str] = None,
-                      skip: int = 0, limit: int = 100) -> List[Shipment]:
-        """List shipments with optional filtering"""
-        query = db.query(Shipment)
+                      after_created_at: Optional[datetime] = None,
+                      after_id: Optional[int] = None,
+                      limit: int = 100) -> List[Shipment]:
+        """
+        List shipments with optional filtering, newest first.
+        Pass the created_at/id of the last row seen to fetch the next page.
+        """
+        # Lines and events arrive in one IN query each; any other relationship
+        # touched on the page raises instead of loading per shipment
+        stmt = lambda_stmt(lambda: select(Shipment).options(
+            selectinload(Shipment.lines), selectinload(Shipment.events), raiseload("*")
+        ))
         if status:
-            query = query.filter(Shipment.status == status)
+            stmt += lambda s: s.where(Shipment.status == status)
         if from_location:
-            query = query.filter(Shipment.from_location == from_location)
-        return query.order_by(Shipment.created_at.desc()).offset(skip).limit(limit).all()
+            stmt += lambda s: s.where(Shipment.from_location == from_location)
+        if after_created_at is not None and after_id is not None:
+            stmt += lambda s: s.where(tuple_(Shipment.created_at, Shipment.id) < tuple_(after_created_at, after_id))
+        stmt += lambda s: s.order_by(Shipment.created_at.desc(), Shipment.id.desc()).limit(limit)
+        return db.execute(stmt).scalars().all()
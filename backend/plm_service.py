@@ -3,141 +3,189 @@ Common Data Environment (CDE) - PLM Service
 Business logic for Product Lifecycle Management domain
 """
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, bindparam, tuple_
+from sqlalchemy.orm import Session, joinedload, raiseload, selectinload
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from contextlib import nullcontext
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
 from decimal import Decimal
 
 from database.saas_models_py37 import (
     Product, ProductRevision, ProductChangeEvent, BOMCurrent, BOMChangeEvent,
-    ProductStatus, RevisionStatus, ProductEventType, BOMEventType
+    ProductStatus, RevisionStatus, ProductEventType, BOMEventType, record_bulk_insert
 )
 from database import schemas
 
 
+# Fixed-shape reads are built once at import; only the bound values change per
+# call, so the statement cache key is computed from an already-built construct
+_GET_PRODUCT_BY_CODE = select(Product).where(Product.product_code == bindparam("product_code")).limit(1)
+
+# List reads raise on any relationship they did not load explicitly, so a
+# serializer touching one shows up as an error rather than a SELECT per row
+_LIST_REVISIONS = select(ProductRevision).options(raiseload("*")).where(
+    ProductRevision.product_id == bindparam("product_id")
+).order_by(ProductRevision.created_at.desc())
+
+_GET_BOM = select(BOMCurrent).options(
+    selectinload(BOMCurrent.component_product), raiseload("*")
+).where(
+    BOMCurrent.product_revision_id == bindparam("revision_id")
+).order_by(BOMCurrent.position)
+
+
 class PLMService:
     """Service layer for PLM operations with event sourcing"""
     
+    # Mutators commit by default. Pass commit=False inside
+    # backend.database.unit_of_work to group several calls into one
+    # transaction; they then only flush, and the caller commits or rolls back.
+    
+    # Change events are written with Core INSERTs: nothing reads them back as
+    # ORM objects, so they skip identity-map and unit-of-work bookkeeping.
+    # create_product is the exception; its event rides the product's flush.
+    
+    @staticmethod
+    def _finish(db: Session, commit: bool):
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+    
+    @staticmethod
+    def _abort(db: Session, commit: bool):
+        if commit:
+            db.rollback()
+    
+    @staticmethod
+    def _apply_changes(target, values: dict) -> dict:
+        """
+        Set the attributes whose value differs from the loaded row.
+        Returns {field: {'old': ..., 'new': ...}} for the change event.
+        """
+        changes = {}
+        for field, new in values.items():
+            old = getattr(target, field)
+            if old != new:
+                changes[field] = {'old': old, 'new': new}
+                setattr(target, field, new)
+        return changes
+    
+    @staticmethod
+    def _savepoint(db: Session, commit: bool):
+        """
+        Inside a caller's transaction, isolate a uniqueness-checked insert in a
+        SAVEPOINT so a duplicate does not poison the outer transaction
+        """
+        return nullcontext() if commit else db.begin_nested()
+    
     # ========================================================================
     # Product Operations
     # ========================================================================
     
     @staticmethod
-    def create_product(db: Session, product_data: schemas.ProductCreate) -> Product:
+    def create_product(db: Session, product_data: schemas.ProductCreate, commit: bool = True) -> Product:
         """
         Create a new product with event tracking
         Transaction: Insert event + Insert state
         """
         try:
-            # Create product state
-            product = Product(
-                product_code=product_data.product_code,
-                name=product_data.name,
-                description=product_data.description,
-                status=product_data.status
-            )
-            db.add(product)
-            db.flush()  # Get product.id
+            payload = product_data.dict()
             
-            # Create event
+            # State and event go out in one flush; the unit of work inserts the
+            # product first and fills in the event's product_id from it
+            product = Product(**payload)
             event = ProductChangeEvent(
-                product_id=product.id,
+                product=product,
                 event_type=ProductEventType.CREATED,
-                event_data={
-                    "product_code": product_data.product_code,
-                    "name": product_data.name,
-                    "description": product_data.description,
-                    "status": product_data.status.value
-                }
+                event_data=dict(payload, status=payload["status"].value)
             )
-            db.add(event)
+            with PLMService._savepoint(db, commit):
+                db.add(event)
+                db.flush()
             
-            # Commit transaction
-            db.commit()
-            db.refresh(product)
+            PLMService._finish(db, commit)
             return product
             
         except IntegrityError as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise ValueError(f"Product with code {product_data.product_code} already exists")
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
-    def update_product(db: Session, product_id: int, product_data: schemas.ProductUpdate) -> Product:
+    def update_product(db: Session, product_id: int, product_data: schemas.ProductUpdate,
+                       commit: bool = True) -> Product:
         """
         Update product with event tracking
         Transaction: Insert event + Update state
         """
         try:
-            product = db.query(Product).filter(Product.id == product_id).first()
+            # Lock the row while reading it, so the 'old' values logged in the
+            # event are exactly the ones this update overwrites
+            product = db.get(Product, product_id, populate_existing=True, with_for_update=True)
             if not product:
                 raise ValueError(f"Product {product_id} not found")
             
-            # Track changes
-            changes = {}
-            if product_data.name is not None:
-                changes['name'] = {'old': product.name, 'new': product_data.name}
-                product.name = product_data.name
-            if product_data.description is not None:
-                changes['description'] = {'old': product.description, 'new': product_data.description}
-                product.description = product_data.description
-            if product_data.status is not None:
-                changes['status'] = {'old': product.status.value, 'new': product_data.status.value}
-                product.status = product_data.status
+            # Track changes; unchanged fields are neither written nor logged
+            changes = PLMService._apply_changes(product, product_data.dict(exclude_none=True))
             
             # Create event if there were changes
             if changes:
                 event_type = ProductEventType.STATUS_CHANGED if 'status' in changes else ProductEventType.UPDATED
-                event = ProductChangeEvent(
+                db.execute(insert(ProductChangeEvent).values(
                     product_id=product.id,
                     event_type=event_type,
                     event_data={"changes": changes}
-                )
-                db.add(event)
+                ))
             
-            db.commit()
-            db.refresh(product)
+            PLMService._finish(db, commit)
             return product
             
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
     def get_product(db: Session, product_id: int) -> Optional[Product]:
         """Get product by ID"""
-        return db.query(Product).filter(Product.id == product_id).first()
+        return db.get(Product, product_id)
     
     @staticmethod
     def get_product_by_code(db: Session, product_code: str) -> Optional[Product]:
         """Get product by code"""
-        return db.query(Product).filter(Product.product_code == product_code).first()
+        return db.execute(_GET_PRODUCT_BY_CODE, {"product_code": product_code}).scalars().first()
     
     @staticmethod
     def list_products(db: Session, status: Optional[ProductStatus] = None, 
-                     skip: int = 0, limit: int = 100) -> List[Product]:
-        """List products with optional filtering"""
+                     after_id: Optional[int] = None, limit: int = 100) -> List[Product]:
+        """
+        List products with optional filtering, in id order.
+        Pass the last id seen as after_id to fetch the next page.
+        """
         query = db.query(Product)
         if status:
             query = query.filter(Product.status == status)
-        return query.offset(skip).limit(limit).all()
+        if after_id is not None:
+            query = query.filter(Product.id > after_id)
+        return query.order_by(Product.id).limit(limit).all()
     
     # ========================================================================
     # Product Revision Operations
     # ========================================================================
     
     @staticmethod
-    def create_revision(db: Session, revision_data: schemas.ProductRevisionCreate) -> ProductRevision:
+    def create_revision(db: Session, revision_data: schemas.ProductRevisionCreate,
+                        commit: bool = True) -> ProductRevision:
         """
         Create a new product revision with event tracking
         Transaction: Insert event + Insert state
         """
         try:
             # Verify product exists
-            product = db.query(Product).filter(Product.id == revision_data.product_id).first()
+            product = db.get(Product, revision_data.product_id)
             if not product:
                 raise ValueError(f"Product {revision_data.product_id} not found")
             
@@ -148,11 +196,12 @@ class PLMService:
                 description=revision_data.description,
                 status=RevisionStatus.DRAFT
             )
-            db.add(revision)
-            db.flush()
+            with PLMService._savepoint(db, commit):
+                db.add(revision)
+                db.flush()
             
             # Create product event
-            event = ProductChangeEvent(
+            db.execute(insert(ProductChangeEvent).values(
                 product_id=revision_data.product_id,
                 event_type=ProductEventType.REVISION_CREATED,
                 event_data={
@@ -160,28 +209,28 @@ class PLMService:
                     "revision_number": revision_data.revision_number,
                     "description": revision_data.description
                 }
-            )
-            db.add(event)
+            ))
             
-            db.commit()
-            db.refresh(revision)
+            PLMService._finish(db, commit)
             return revision
             
         except IntegrityError:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise ValueError(f"Revision {revision_data.revision_number} already exists for this product")
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
-    def release_revision(db: Session, revision_id: int) -> ProductRevision:
+    def release_revision(db: Session, revision_id: int, commit: bool = True) -> ProductRevision:
         """
         Release a product revision
         Transaction: Insert event + Update state + Update product
         """
         try:
-            revision = db.query(ProductRevision).filter(ProductRevision.id == revision_id).first()
+            revision = db.query(ProductRevision).options(
+                joinedload(ProductRevision.product)
+            ).filter(ProductRevision.id == revision_id).first()
             if not revision:
                 raise ValueError(f"Revision {revision_id} not found")
             
@@ -193,11 +242,10 @@ class PLMService:
             revision.released_at = datetime.utcnow()
             
             # Update product to point to this revision
-            product = db.query(Product).filter(Product.id == revision.product_id).first()
-            product.current_revision_id = revision.id
+            revision.product.current_revision_id = revision.id
             
             # Create event
-            event = ProductChangeEvent(
+            db.execute(insert(ProductChangeEvent).values(
                 product_id=revision.product_id,
                 event_type=ProductEventType.REVISION_RELEASED,
                 event_data={
@@ -205,165 +253,217 @@ class PLMService:
                     "revision_number": revision.revision_number,
                     "released_at": revision.released_at.isoformat()
                 }
-            )
-            db.add(event)
+            ))
             
-            db.commit()
-            db.refresh(revision)
+            PLMService._finish(db, commit)
             return revision
             
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
     def get_revision(db: Session, revision_id: int) -> Optional[ProductRevision]:
         """Get revision by ID"""
-        return db.query(ProductRevision).filter(ProductRevision.id == revision_id).first()
+        return db.get(ProductRevision, revision_id)
     
     @staticmethod
     def list_revisions(db: Session, product_id: int) -> List[ProductRevision]:
         """List all revisions for a product"""
-        return db.query(ProductRevision).filter(
-            ProductRevision.product_id == product_id
-        ).order_by(ProductRevision.created_at.desc()).all()
+        return db.execute(_LIST_REVISIONS, {"product_id": product_id}).scalars().all()
     
     # ========================================================================
     # BOM Operations
     # ========================================================================
     
     @staticmethod
-    def add_bom_item(db: Session, revision_id: int, bom_data: schemas.BOMItemCreate) -> BOMCurrent:
+    def _ensure_products_exist(db: Session, ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Check a set of products with one IN query; returns their codes by id
+        and raises ValueError naming any that are missing
+        """
+        ids = set(ids)
+        codes = dict(db.execute(
+            select(Product.id, Product.product_code).where(Product.id.in_(ids))
+        ).all())
+        missing = ids - codes.keys()
+        if missing:
+            raise ValueError(f"Products not found: {', '.join(str(pid) for pid in sorted(missing))}")
+        return codes
+    
+    @staticmethod
+    def add_bom_item(db: Session, revision_id: int, bom_data: schemas.BOMItemCreate,
+                     commit: bool = True) -> BOMCurrent:
         """
         Add item to BOM with event tracking
         Transaction: Insert event + Insert state
         """
         try:
-            revision = db.query(ProductRevision).filter(ProductRevision.id == revision_id).first()
+            revision = db.get(ProductRevision, revision_id)
             if not revision:
                 raise ValueError(f"Revision {revision_id} not found")
             
             if revision.status == RevisionStatus.RELEASED:
                 raise ValueError("Cannot modify BOM of released revision")
             
+            item = bom_data.dict()
+            
             # Verify child product exists
-            child = db.query(Product).filter(Product.id == bom_data.child_product_id).first()
-            if not child:
-                raise ValueError(f"Child product {bom_data.child_product_id} not found")
+            child_code = PLMService._ensure_products_exist(db, [item["child_product_id"]])[item["child_product_id"]]
             
             # Create BOM item state
             bom_item = BOMCurrent(
                 parent_product_id=revision.product_id,
                 parent_revision_id=revision_id,
-                child_product_id=bom_data.child_product_id,
-                quantity=bom_data.quantity,
-                unit=bom_data.unit,
-                position_number=bom_data.position_number,
-                reference_designator=bom_data.reference_designator,
-                notes=bom_data.notes
+                **item
             )
-            db.add(bom_item)
-            db.flush()
+            # A position clash is caught by the unique (revision, position) index
+            with PLMService._savepoint(db, commit):
+                db.add(bom_item)
+                db.flush()
             
             # Create BOM event
-            event = BOMChangeEvent(
+            db.execute(insert(BOMChangeEvent).values(
                 parent_revision_id=revision_id,
                 event_type=BOMEventType.ITEM_ADDED,
                 bom_item_id=bom_item.id,
                 event_data={
                     "bom_item_id": bom_item.id,
-                    "child_product_id": bom_data.child_product_id,
-                    "child_product_code": child.product_code,
-                    "quantity": str(bom_data.quantity),
-                    "unit": bom_data.unit,
-                    "position_number": bom_data.position_number
+                    "child_product_id": item["child_product_id"],
+                    "child_product_code": child_code,
+                    "quantity": str(item["quantity"]),
+                    "unit": item["unit"],
+                    "position_number": item["position_number"]
                 }
-            )
-            db.add(event)
+            ))
             
-            db.commit()
-            db.refresh(bom_item)
+            PLMService._finish(db, commit)
             return bom_item
             
         except IntegrityError:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise ValueError("BOM item already exists at this position")
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
+            raise
+    
+    @staticmethod
+    def add_bom_items_bulk(db: Session, revision_id: int,
+                           items: List[schemas.BOMItemCreate], commit: bool = True) -> List[BOMCurrent]:
+        """
+        Add many items to a BOM in one transaction
+        Transaction: Insert events + Insert state (all items)
+        """
+        try:
+            revision = db.get(ProductRevision, revision_id)
+            if not revision:
+                raise ValueError(f"Revision {revision_id} not found")
+            
+            if revision.status == RevisionStatus.RELEASED:
+                raise ValueError("Cannot modify BOM of released revision")
+            
+            payloads = [item.dict() for item in items]
+            
+            # Verify all child products with one lookup
+            child_codes = PLMService._ensure_products_exist(db, (item["child_product_id"] for item in payloads))
+            
+            # BOM state goes through one flush so its mapper events still fire;
+            # the events only need the generated ids. A position clash is
+            # caught by the unique (revision, position) index
+            bom_items = [
+                BOMCurrent(parent_product_id=revision.product_id, parent_revision_id=revision_id, **item)
+                for item in payloads
+            ]
+            with PLMService._savepoint(db, commit):
+                db.add_all(bom_items)
+                db.flush()
+            
+            event_rows = [
+                {
+                    "parent_revision_id": revision_id,
+                    "event_type": BOMEventType.ITEM_ADDED,
+                    "bom_item_id": bom_item.id,
+                    "event_data": {
+                        "bom_item_id": bom_item.id,
+                        "child_product_id": item["child_product_id"],
+                        "child_product_code": child_codes[item["child_product_id"]],
+                        "quantity": str(item["quantity"]),
+                        "unit": item["unit"],
+                        "position_number": item["position_number"]
+                    }
+                }
+                for bom_item, item in zip(bom_items, payloads)
+            ]
+            if event_rows:
+                db.execute(insert(BOMChangeEvent), event_rows)
+                record_bulk_insert(db.connection(), BOMChangeEvent, event_rows)
+            
+            PLMService._finish(db, commit)
+            return bom_items
+            
+        except IntegrityError:
+            PLMService._abort(db, commit)
+            raise ValueError("BOM item already exists at this position")
+        except Exception as e:
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
-    def update_bom_item(db: Session, bom_item_id: int, bom_data: schemas.BOMItemUpdate) -> BOMCurrent:
+    def update_bom_item(db: Session, bom_item_id: int, bom_data: schemas.BOMItemUpdate,
+                        commit: bool = True) -> BOMCurrent:
         """
         Update BOM item with event tracking
         Transaction: Insert event + Update state
         """
         try:
-            bom_item = db.query(BOMCurrent).filter(BOMCurrent.id == bom_item_id).first()
+            # Locks the item and its revision: the logged pre-image matches
+            # what is overwritten, and the revision can't be released meanwhile
+            bom_item = db.query(BOMCurrent).options(
+                joinedload(BOMCurrent.revision)
+            ).filter(BOMCurrent.id == bom_item_id).populate_existing().with_for_update().first()
             if not bom_item:
                 raise ValueError(f"BOM item {bom_item_id} not found")
             
-            revision = db.query(ProductRevision).filter(
-                ProductRevision.id == bom_item.parent_revision_id
-            ).first()
-            if revision.status == RevisionStatus.RELEASED:
+            if bom_item.revision.status == RevisionStatus.RELEASED:
                 raise ValueError("Cannot modify BOM of released revision")
             
-            # Track changes
-            changes = {}
-            if bom_data.quantity is not None:
-                changes['quantity'] = {'old': str(bom_item.quantity), 'new': str(bom_data.quantity)}
-                bom_item.quantity = bom_data.quantity
-            if bom_data.unit is not None:
-                changes['unit'] = {'old': bom_item.unit, 'new': bom_data.unit}
-                bom_item.unit = bom_data.unit
-            if bom_data.position_number is not None:
-                changes['position_number'] = {'old': bom_item.position_number, 'new': bom_data.position_number}
-                bom_item.position_number = bom_data.position_number
-            if bom_data.reference_designator is not None:
-                changes['reference_designator'] = {'old': bom_item.reference_designator, 'new': bom_data.reference_designator}
-                bom_item.reference_designator = bom_data.reference_designator
-            if bom_data.notes is not None:
-                changes['notes'] = {'old': bom_item.notes, 'new': bom_data.notes}
-                bom_item.notes = bom_data.notes
+            # Track changes; unchanged fields are neither written nor logged
+            changes = PLMService._apply_changes(bom_item, bom_data.dict(exclude_none=True))
             
             # Create event if there were changes
             if changes:
-                event = BOMChangeEvent(
+                db.execute(insert(BOMChangeEvent).values(
                     parent_revision_id=bom_item.parent_revision_id,
                     event_type=BOMEventType.ITEM_UPDATED,
                     bom_item_id=bom_item.id,
                     event_data={"changes": changes}
-                )
-                db.add(event)
+                ))
             
-            db.commit()
-            db.refresh(bom_item)
+            PLMService._finish(db, commit)
             return bom_item
             
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
-    def remove_bom_item(db: Session, bom_item_id: int) -> bool:
+    def remove_bom_item(db: Session, bom_item_id: int, commit: bool = True) -> bool:
         """
         Remove BOM item with event tracking
         Transaction: Insert event + Delete state
         """
         try:
-            bom_item = db.query(BOMCurrent).filter(BOMCurrent.id == bom_item_id).first()
+            bom_item = db.query(BOMCurrent).options(
+                joinedload(BOMCurrent.revision)
+            ).filter(BOMCurrent.id == bom_item_id).first()
             if not bom_item:
                 raise ValueError(f"BOM item {bom_item_id} not found")
             
-            revision = db.query(ProductRevision).filter(
-                ProductRevision.id == bom_item.parent_revision_id
-            ).first()
-            if revision.status == RevisionStatus.RELEASED:
+            if bom_item.revision.status == RevisionStatus.RELEASED:
                 raise ValueError("Cannot modify BOM of released revision")
             
             # Create event before deletion
-            event = BOMChangeEvent(
+            db.execute(insert(BOMChangeEvent).values(
                 parent_revision_id=bom_item.parent_revision_id,
                 event_type=BOMEventType.ITEM_REMOVED,
                 bom_item_id=bom_item.id,
@@ -373,29 +473,41 @@ class PLMService:
                     "quantity": str(bom_item.quantity),
                     "position_number": bom_item.position_number
                 }
-            )
-            db.add(event)
+            ))
             
             # Delete state
             db.delete(bom_item)
             
-            db.commit()
+            PLMService._finish(db, commit)
             return True
             
         except Exception as e:
-            db.rollback()
+            PLMService._abort(db, commit)
             raise
     
     @staticmethod
     def get_bom(db: Session, revision_id: int) -> List[BOMCurrent]:
         """Get complete BOM for a revision"""
-        return db.query(BOMCurrent).filter(
-            BOMCurrent.parent_revision_id == revision_id
-        ).order_by(BOMCurrent.position_number).all()
+        return db.execute(_GET_BOM, {"revision_id": revision_id}).scalars().all()
     
     @staticmethod
-    def get_product_change_events(db: Session, product_id: int, limit: int = 50) -> List[ProductChangeEvent]:
-        """Get change history for a product"""
-        return db.query(ProductChangeEvent).filter(
-            ProductChangeEvent.product_id == product_id
-        ).order_by(ProductChangeEvent.created_at.desc()).limit(limit).all()
+    def get_product_change_events(db: Session, product_id: int,
+                                  after_created_at: Optional[datetime] = None,
+                                  after_id: Optional[int] = None,
+                                  since: Optional[datetime] = None,
+                                  limit: int = 50) -> List[ProductChangeEvent]:
+        """
+        Get change history for a product, newest first.
+        Pass the created_at/id of the last event seen to fetch the next page,
+        and `since` to bound the scan to a recent time window.
+        """
+        query = db.query(ProductChangeEvent).filter(ProductChangeEvent.product_id == product_id)
+        if since is not None:
+            query = query.filter(ProductChangeEvent.created_at >= since)
+        if after_created_at is not None and after_id is not None:
+            query = query.filter(
+                tuple_(ProductChangeEvent.created_at, ProductChangeEvent.id) < tuple_(after_created_at, after_id)
+            )
+        return query.order_by(
+            ProductChangeEvent.created_at.desc(), ProductChangeEvent.id.desc()
+        ).limit(limit).all()
@@ -0,0 +1,184 @@
+"""
+Common Data Environment (CDE) - Rate Limit Service
+Token-bucket request throttling, shared by all workers through Redis
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+from database.saas_models_py37 import RateLimitCounter
+from backend.database import get_db_context
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+# Off unless RATE_LIMIT_ENABLED is set. Each key gets a bucket of
+# RATE_LIMIT_CAPACITY tokens that refills at RATE_LIMIT_REFILL_PER_SECOND; a
+# request spends one token. Buckets live in Redis when REDIS_URL is set, so
+# every worker sees the same counts. Without Redis, or while it is unreachable,
+# a fixed-window count in rate_limit_counter is shared instead, and only if
+# that fails too does each process fall back to its own buckets.
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_CAPACITY = int(os.getenv("RATE_LIMIT_CAPACITY", "120"))
+RATE_LIMIT_REFILL_PER_SECOND = float(os.getenv("RATE_LIMIT_REFILL_PER_SECOND", "2"))
+RATE_LIMIT_LOCAL_MAX_ENTRIES = 10000
+
+REDIS_URL = os.getenv("REDIS_URL")
+_redis_client = redis.Redis.from_url(REDIS_URL) if HAS_REDIS and REDIS_URL else None
+
+# Refill, spend and store in one atomic step on the Redis server.
+# KEYS[1] = bucket key; ARGV = capacity, refill per second, now (ms), cost.
+# Lua numbers come back truncated to integers, so tokens are returned as text.
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+# register_script runs EVALSHA and reloads the script if Redis lost it
+_token_bucket = _redis_client.register_script(_TOKEN_BUCKET_LUA) if _redis_client is not None else None
+
+_local_buckets = {}
+_local_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    """Outcome of spending from a bucket"""
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until enough tokens have refilled; 0 when allowed
+
+
+def _decision(allowed, tokens, cost, rate):
+    retry_after = 0.0 if allowed else (cost - tokens) / rate
+    return RateLimitDecision(allowed=allowed, remaining=int(tokens), retry_after=retry_after)
+
+
+def rate_limit_key(organization_id=None, user_id=None, ip_address=None) -> str:
+    """Bucket key rl:{org_id}:{user_id or ip}; callers without a token use org 'anon'"""
+    return "rl:{}:{}".format(organization_id or "anon", user_id or ip_address)
+
+
+def _hit_sql(key, cost, capacity, rate):
+    """
+    Fixed-window count in rate_limit_counter, shared by all workers. A window
+    lasts as long as an empty bucket takes to refill and admits `capacity`.
+    """
+    window = max(int(math.ceil(capacity / rate)), 1)
+    now = time.time()
+    window_start = datetime.utcfromtimestamp(int(now) // window * window)
+    window_end = window_start + timedelta(seconds=window)
+    table = RateLimitCounter.__table__
+    row = dict(key=key, count=cost, window_start=window_start, window_end=window_end)
+    
+    with get_db_context() as db:
+        dialect = db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table).values(**row)
+            stmt = stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted.count)
+        elif dialect == "postgresql":
+            stmt = postgresql.insert(table).values(**row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.key, table.c.window_start],
+                set_={"count": table.c.count + stmt.excluded.count}
+            )
+        else:
+            return None
+        db.execute(stmt)
+        count = db.execute(
+            select(table.c.count).where(table.c.key == key, table.c.window_start == window_start)
+        ).scalar()
+    
+    allowed = count <= capacity
+    retry_after = 0.0 if allowed else (window_end - datetime.utcfromtimestamp(now)).total_seconds()
+    return RateLimitDecision(allowed=allowed, remaining=max(capacity - count, 0), retry_after=retry_after)
+
+
+def _hit_local(key, cost, capacity, rate):
+    """Token bucket in this process; used when neither Redis nor the SQL counter works"""
+    now = time.monotonic()
+    with _local_lock:
+        tokens, ts = _local_buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - ts) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        
+        if key not in _local_buckets and len(_local_buckets) >= RATE_LIMIT_LOCAL_MAX_ENTRIES:
+            # Buckets idle long enough to have refilled carry no state
+            full_after = capacity / rate
+            for idle in [k for k, (_, seen) in _local_buckets.items() if now - seen >= full_after]:
+                del _local_buckets[idle]
+        _local_buckets[key] = (tokens, now)
+    return _decision(allowed, tokens, cost, rate)
+
+
+class RateLimitService:
+    """Service layer for request rate limiting"""
+    
+    @staticmethod
+    def hit(key: str, cost: int = 1, capacity: Optional[int] = None,
+            rate: Optional[float] = None) -> RateLimitDecision:
+        """Spend `cost` tokens from the bucket for `key`"""
+        capacity = capacity or RATE_LIMIT_CAPACITY
+        rate = rate or RATE_LIMIT_REFILL_PER_SECOND
+        
+        if _token_bucket is not None:
+            try:
+                allowed, tokens = _token_bucket(
+                    keys=[key], args=[capacity, rate, int(time.time() * 1000), cost]
+                )
+                return _decision(bool(allowed), float(tokens), cost, rate)
+            except redis.RedisError:
+                logger.warning("Redis rate limiting failed; using the SQL counter", exc_info=True)
+        
+        try:
+            decision = _hit_sql(key, cost, capacity, rate)
+            if decision is not None:
+                return decision
+        except SQLAlchemyError:
+            # Degrade to per-process limits rather than failing requests
+            logger.warning("SQL rate limiting failed; using per-process buckets", exc_info=True)
+        
+        return _hit_local(key, cost, capacity, rate)
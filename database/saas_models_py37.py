@@ -5,10 +5,16 @@ Python 3.7 Compatible Version
 
 from sqlalchemy import (
     Column, Integer, BigInteger, String, Text, Boolean, DateTime, 
-    Enum, JSON, ForeignKey, Index, TIMESTAMP, UniqueConstraint
+    Enum, JSON, ForeignKey, Index, TIMESTAMP, UniqueConstraint, Numeric, Float, Computed,
+    event, select, func
 )
+from sqlalchemy.dialects import mysql, postgresql
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.sql.expression import FunctionElement, literal_column
 from datetime import datetime
 import enum
 
@@ -18,21 +24,99 @@ try:
 except ImportError:
     Base = declarative_base()
 
+# JSON payload columns; binary JSONB when deployed on PostgreSQL
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+
+class _days_between(FunctionElement):
+    """Fractional days from the first timestamp to the second, per dialect"""
+    type = Float()
+    name = 'days_between'
+    inherit_cache = True
+
+
+@compiles(_days_between)
+def _days_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "TIMESTAMPDIFF(SECOND, %s, %s) / 86400" % (compiler.process(start, **kw), compiler.process(end, **kw))
+
+
+@compiles(_days_between, 'postgresql')
+def _days_between_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "EXTRACT(EPOCH FROM (%s - %s)) / 86400" % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(_days_between, 'sqlite')
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "julianday(%s) - julianday(%s)" % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+# Timestamp columns declare both defaults on purpose. server_default=now()
+# covers rows written outside the ORM; the Python default puts the value on
+# the instance at flush. Sessions don't expire on commit and MySQL has no
+# RETURNING, so without it every new object would need a re-SELECT before its
+# timestamps could be serialized. onupdate stays Python-side because create_all
+# emits no ON UPDATE clause.
+
+# Explicit bcrypt cost so hashing latency doesn't drift with library defaults
+BCRYPT_ROUNDS = 11
+
 # For password hashing - compatible with Python 3.7
 try:
-    from passlib.hash import bcrypt
+    from passlib.hash import bcrypt as _passlib_bcrypt
+    bcrypt = _passlib_bcrypt.using(rounds=BCRYPT_ROUNDS)
 except ImportError:
     import bcrypt as bcrypt_lib
     
     class bcrypt:
         @staticmethod
         def hash(password):
-            return bcrypt_lib.hashpw(password.encode(), bcrypt_lib.gensalt()).decode()
+            return bcrypt_lib.hashpw(password.encode(), bcrypt_lib.gensalt(rounds=BCRYPT_ROUNDS)).decode()
         
         @staticmethod
         def verify(password, hashed):
             return bcrypt_lib.checkpw(password.encode(), hashed.encode())
 
+# argon2id for new password hashes; bcrypt hashes keep verifying and are
+# upgraded on the next successful login. bcrypt-only hashing remains as a
+# fallback for environments without argon2-cffi.
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHash
+    _argon2 = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+    HAS_ARGON2 = True
+except ImportError:
+    HAS_ARGON2 = False
+
+
+def hash_password(password):
+    """Hash a password with the preferred scheme"""
+    if HAS_ARGON2:
+        return _argon2.hash(password)
+    return bcrypt.hash(password)
+
+
+def verify_password_hash(password, hashed):
+    """Verify a password against an argon2id or bcrypt hash"""
+    if hashed.startswith("$argon2"):
+        if not HAS_ARGON2:
+            return False
+        try:
+            return _argon2.verify(hashed, password)
+        except (VerificationError, InvalidHash):
+            return False
+    return bcrypt.verify(password, hashed)
+
+
+def password_needs_rehash(hashed):
+    """True when a hash was made with an older scheme or parameters"""
+    if not HAS_ARGON2:
+        return False
+    if not hashed.startswith("$argon2"):
+        return True
+    return _argon2.check_needs_rehash(hashed)
+
 
 # ============================================================================
 # Enums
@@ -105,12 +189,12 @@ class Organization(Base):
     max_storage_gb = Column(Integer, default=5)
     
     # Settings
-    settings = Column(JSON)
+    settings = Column(JSONType)
     
     # Status
     is_active = Column(Boolean, default=True)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     # Relationships
     users = relationship("User", back_populates="organization")
@@ -129,7 +213,7 @@ class OrganizationInvitation(Base):
     invited_by_id = Column(BigInteger, ForeignKey('user.id'))
     accepted_at = Column(DateTime)
     expires_at = Column(DateTime, nullable=False)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
     
     # Relationships
     organization = relationship("Organization", back_populates="invitations")
@@ -148,6 +232,12 @@ class User(Base):
     
     # Authentication
     email = Column(String(255), nullable=False, unique=True, index=True)
+    # Lower-cased copy for case-insensitive lookups by index probe; binary
+    # collation on MySQL, where the default collation is itself case-insensitive
+    email_lower = Column(
+        String(255).with_variant(String(255, collation='utf8mb4_bin'), 'mysql'),
+        Computed("LOWER(email)", persisted=True), unique=True
+    )
     password_hash = Column(String(255), nullable=False)
     
     # Profile
@@ -158,7 +248,7 @@ class User(Base):
     
     # Authorization
     role = Column(Enum(UserRole), default=UserRole.USER)
-    permissions = Column(JSON)
+    permissions = Column(JSONType)
     
     # Status
     is_active = Column(Boolean, default=True)
@@ -173,10 +263,10 @@ class User(Base):
     # Preferences
     timezone = Column(String(50), default='UTC')
     language = Column(String(10), default='en')
-    preferences = Column(JSON)
+    preferences = Column(JSONType)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     # Relationships
     organization = relationship("Organization", back_populates="users")
@@ -187,12 +277,12 @@ class User(Base):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = bcrypt.hash(password)
+        self.password_hash = hash_password(password)
         self.password_changed_at = datetime.utcnow()
     
     def verify_password(self, password):
         """Verify password"""
-        return bcrypt.verify(password, self.password_hash)
+        return verify_password_hash(password, self.password_hash)
     
     @property
     def full_name(self):
@@ -216,8 +306,8 @@ class UserSession(Base):
     refresh_expires_at = Column(DateTime)
     revoked_at = Column(DateTime)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    last_activity_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    last_activity_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="sessions")
@@ -232,15 +322,15 @@ class ApiKey(Base):
     
     name = Column(String(255), nullable=False)
     key_hash = Column(String(255), nullable=False, unique=True, index=True)
-    prefix = Column(String(20), nullable=False)
+    prefix = Column(String(20), nullable=False, index=True)
     
-    scopes = Column(JSON)
+    scopes = Column(JSONType)
     
     last_used_at = Column(DateTime)
     expires_at = Column(DateTime)
     revoked_at = Column(DateTime)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="api_keys")
@@ -261,13 +351,13 @@ class AuditLog(Base):
     resource_type = Column(String(100), nullable=False)
     resource_id = Column(BigInteger)
     
-    changes = Column(JSON)
-    audit_metadata = Column(JSON)
+    changes = Column(JSONType)
+    audit_metadata = Column(JSONType)
     
     ip_address = Column(String(50))
     user_agent = Column(Text)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow, index=True)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), index=True)
     
     # Relationships
     user = relationship("User", back_populates="audit_logs")
@@ -275,6 +365,7 @@ class AuditLog(Base):
     __table_args__ = (
         Index('idx_audit_resource', 'organization_id', 'resource_type', 'resource_id'),
         Index('idx_audit_user_time', 'user_id', 'created_at'),
+        Index('idx_audit_org_time', 'organization_id', 'created_at'),
     )
 
 
@@ -293,12 +384,12 @@ class Notification(Base):
     title = Column(String(255), nullable=False)
     message = Column(Text, nullable=False)
     
-    data = Column(JSON)
+    data = Column(JSONType)
     
     is_read = Column(Boolean, default=False)
     read_at = Column(DateTime)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow, index=True)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), index=True)
     
     # Relationships
     user = relationship("User", back_populates="notifications")
@@ -317,14 +408,14 @@ class Webhook(Base):
     url = Column(String(500), nullable=False)
     secret = Column(String(255), nullable=False)
     
-    events = Column(JSON, nullable=False)
+    events = Column(JSONType, nullable=False)
     
     is_active = Column(Boolean, default=True)
     last_triggered_at = Column(DateTime)
     failure_count = Column(Integer, default=0)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
 
 
 class WebhookDelivery(Base):
@@ -334,14 +425,14 @@ class WebhookDelivery(Base):
     webhook_id = Column(BigInteger, ForeignKey('webhook.id'), nullable=False)
     
     event_type = Column(String(100), nullable=False)
-    payload = Column(JSON, nullable=False)
+    payload = Column(JSONType, nullable=False)
     
     status_code = Column(Integer)
     response = Column(Text)
     error = Column(Text)
     
     delivered_at = Column(DateTime)
-    created_at = Column(TIMESTAMP, default=datetime.utcnow, index=True)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), index=True)
 
 
 # ============================================================================
@@ -367,9 +458,9 @@ class Attachment(Base):
     storage_provider = Column(String(50), default='local')
     
     description = Column(Text)
-    attachment_metadata = Column(JSON)
+    attachment_metadata = Column(JSONType)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow, index=True)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), index=True)
     
     __table_args__ = (
         Index('idx_attachment_entity', 'entity_type', 'entity_id'),
@@ -392,11 +483,11 @@ class FeatureFlag(Base):
     is_enabled = Column(Boolean, default=False)
     rollout_percentage = Column(Integer, default=0)
     
-    allowed_organizations = Column(JSON)
-    allowed_users = Column(JSON)
+    allowed_organizations = Column(JSONType)
+    allowed_users = Column(JSONType)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
 
 
 # ============================================================================
@@ -414,8 +505,8 @@ class RateLimitCounter(Base):
     window_start = Column(DateTime, nullable=False, index=True)
     window_end = Column(DateTime, nullable=False)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     __table_args__ = (
         UniqueConstraint('key', 'window_start', name='uq_rate_limit_key_window'),
@@ -462,11 +553,12 @@ class Product(Base):
     
     current_revision_id = Column(BigInteger, ForeignKey('product_revision.id'))
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     __table_args__ = (
         Index('idx_product_org_code', 'organization_id', 'product_code'),
+        Index('idx_product_org_status', 'organization_id', 'status'),
     )
 
 class ProductRevision(Base):
@@ -483,11 +575,14 @@ class ProductRevision(Base):
     released_at = Column(DateTime)
     released_by_id = Column(BigInteger, ForeignKey('user.id'))
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+    
+    product = relationship("Product", foreign_keys=[product_id])
     
     __table_args__ = (
         Index('idx_revision_product', 'product_id', 'revision_number'),
+        Index('idx_rev_product_created', 'product_id', 'created_at'),
     )
 
 class ProductChangeEvent(Base):
@@ -497,10 +592,16 @@ class ProductChangeEvent(Base):
     product_id = Column(BigInteger, ForeignKey('product.id'), nullable=False)
     
     event_type = Column(Enum(ProductEventType), nullable=False)
-    event_data = Column(JSON)
+    event_data = Column(JSONType)
     
     created_by_id = Column(BigInteger, ForeignKey('user.id'))
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    
+    product = relationship("Product", foreign_keys=[product_id])
+    
+    __table_args__ = (
+        Index('idx_event_product_time', 'product_id', 'created_at'),
+    )
 
 class BOMCurrent(Base):
     __tablename__ = 'bom_current'
@@ -515,8 +616,16 @@ class BOMCurrent(Base):
     position = Column(String(100))
     notes = Column(Text)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+    
+    revision = relationship("ProductRevision", foreign_keys=[product_revision_id])
+    component_product = relationship("Product", foreign_keys=[component_product_id], lazy="raise")
+    
+    __table_args__ = (
+        # Unique per revision; NULL positions never collide, as in a partial index
+        Index('idx_bom_rev_pos', 'product_revision_id', 'position', unique=True),
+    )
 
 class BOMChangeEvent(Base):
     __tablename__ = 'bom_change_event'
@@ -525,10 +634,14 @@ class BOMChangeEvent(Base):
     product_revision_id = Column(BigInteger, ForeignKey('product_revision.id'), nullable=False)
     
     event_type = Column(Enum(BOMEventType), nullable=False)
-    event_data = Column(JSON)
+    event_data = Column(JSONType)
     
     created_by_id = Column(BigInteger, ForeignKey('user.id'))
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (
+        Index('idx_bomevent_rev_time', 'product_revision_id', 'created_at'),
+    )
 
 
 # ============================================================================
@@ -537,10 +650,18 @@ class BOMChangeEvent(Base):
 
 class TransactionType(str, enum.Enum):
     RECEIPT = "receipt"
+    ISSUE = "issue"
     CONSUMPTION = "consumption"
     ADJUSTMENT = "adjustment"
     RETURN = "return"
     TRANSFER = "transfer"
+    TRANSFER_OUT = "transfer_out"
+    TRANSFER_IN = "transfer_in"
+    RESERVATION = "reservation"
+    RELEASE_RESERVATION = "release_reservation"
+
+# Transaction types that take stock out of inventory for good
+OUTBOUND_TRANSACTION_TYPES = (TransactionType.ISSUE, TransactionType.CONSUMPTION)
 
 class ShipmentStatus(str, enum.Enum):
     PENDING = "pending"
@@ -573,11 +694,12 @@ class InventoryBalance(Base):
     last_counted_at = Column(DateTime)
     last_transaction_at = Column(DateTime)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
     
     __table_args__ = (
-        Index('idx_inventory_product_location', 'product_id', 'location_code'),
+        Index('idx_inventory_product_location', 'product_id', 'location_code', unique=True),
+        Index('idx_inventory_product_on_hand', 'product_id', 'quantity_on_hand'),
     )
 
 class InventoryTransaction(Base):
@@ -589,15 +711,25 @@ class InventoryTransaction(Base):
     transaction_type = Column(Enum(TransactionType), nullable=False)
     location_code = Column(String(100), nullable=False)
     quantity = Column(BigInteger, nullable=False)
+    # On-hand quantity right after this transaction, written together with the
+    # locked balance row so history reads never re-sum earlier transactions
+    balance_after = Column(BigInteger)
     
     reference_type = Column(String(100))
     reference_id = Column(BigInteger)
     
     notes = Column(Text)
-    transaction_data = Column(JSON)
+    transaction_data = Column(JSONType)
     
     created_by_id = Column(BigInteger, ForeignKey('user.id'))
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    
+    __table_args__ = (
+        Index('idx_invtxn_created_type', 'created_at', 'transaction_type'),
+        Index('idx_invtxn_product_location', 'product_id', 'location_code', 'created_at'),
+        Index('idx_invtxn_product_created', 'product_id', 'created_at'),
+        Index('idx_invtxn_created_id', 'created_at', 'id'),
+    )
 
 class Shipment(Base):
     __tablename__ = 'shipment'
@@ -616,10 +748,24 @@ class Shipment(Base):
     tracking_number = Column(String(100))
     
     notes = Column(Text)
-    shipment_data = Column(JSON)
+    shipment_data = Column(JSONType)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Days from creation to shipping, maintained by the database
+    fulfillment_days = Column(
+        Float, Computed(_days_between(literal_column('created_at'), literal_column('actual_ship_date')), persisted=True)
+    )
+    
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+    
+    lines = relationship("ShipmentLine", back_populates="shipment", order_by="ShipmentLine.id")
+    events = relationship("ShipmentEvent", back_populates="shipment", order_by="ShipmentEvent.id")
+    
+    __table_args__ = (
+        Index('idx_shipment_created_status', 'created_at', 'status'),
+        Index('idx_shipment_created_id', 'created_at', 'id'),
+        Index('idx_shipment_org_status_date', 'organization_id', 'status', 'scheduled_ship_date'),
+    )
 
 class ShipmentLine(Base):
     __tablename__ = 'shipment_line'
@@ -635,8 +781,15 @@ class ShipmentLine(Base):
     line_number = Column(Integer)
     notes = Column(Text)
     
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
-    updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+    
+    shipment = relationship("Shipment", back_populates="lines")
+    
+    __table_args__ = (
+        Index('idx_shipline_shipment_product', 'shipment_id', 'product_id'),
+        Index('idx_shipline_product', 'product_id'),
+    )
 
 class ShipmentEvent(Base):
     __tablename__ = 'shipment_event'
@@ -645,7 +798,289 @@ class ShipmentEvent(Base):
     shipment_id = Column(BigInteger, ForeignKey('shipment.id'), nullable=False)
     
     event_type = Column(Enum(ShipmentEventType), nullable=False)
-    event_data = Column(JSON)
+    event_data = Column(JSONType)
     
     created_by_id = Column(BigInteger, ForeignKey('user.id'))
-    created_at = Column(TIMESTAMP, default=datetime.utcnow)
+    created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
+    
+    shipment = relationship("Shipment", back_populates="events")
+    
+    __table_args__ = (
+        Index('idx_shipevent_shipment_created', 'shipment_id', 'created_at'),
+    )
+
+
+# ============================================================================
+# Materialized KPI Roll-ups (maintained incrementally from InventoryBalance)
+# ============================================================================
+
+LOW_STOCK_THRESHOLD = 10
+
+class InventoryKpiSummary(Base):
+    """Single-row roll-up backing AnalyticsService.get_inventory_kpis"""
+    __tablename__ = 'inventory_kpi_mv'
+    
+    id = Column(Integer, primary_key=True, default=1)
+    
+    total_on_hand = Column(Numeric(15, 4), nullable=False, default=0)
+    total_reserved = Column(Numeric(15, 4), nullable=False, default=0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+    zero_stock_count = Column(Integer, nullable=False, default=0)
+    active_locations = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+
+class InventoryStatusSummary(Base):
+    """On-hand quantity rolled up by product status"""
+    __tablename__ = 'inventory_status_mv'
+    
+    status = Column(Enum(ProductStatus), primary_key=True)
+    total_on_hand = Column(Numeric(15, 4), nullable=False, default=0)
+    
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+
+class InventoryLocationSummary(Base):
+    """Per-location roll-up of balances"""
+    __tablename__ = 'inventory_location_mv'
+    
+    location_code = Column(String(100), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+    total_on_hand = Column(Numeric(15, 4), nullable=False, default=0)
+    total_reserved = Column(Numeric(15, 4), nullable=False, default=0)
+    
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+
+
+class KpiCounter(Base):
+    """Named running counter backing AnalyticsService.get_performance_benchmarks"""
+    __tablename__ = 'kpi_counters'
+    
+    name = Column(String(100), primary_key=True)
+    value = Column(Numeric(20, 4), nullable=False, default=0)
+    
+    updated_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now(), onupdate=datetime.utcnow)
+
+
+def _balance_flags(on_hand, reserved):
+    """Return (low_stock, zero_stock) flags for a balance as 0/1 ints"""
+    on_hand = on_hand or 0
+    reserved = reserved or 0
+    return int(on_hand - reserved < LOW_STOCK_THRESHOLD), int(on_hand == 0)
+
+
+def _previous_value(target, attr):
+    """Value of attr before the pending flush"""
+    history = get_history(target, attr)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(target, attr)
+
+
+def _upsert_add(connection, table, key, values):
+    """
+    Add values onto the row keyed by key, inserting it with values when absent.
+    One atomic statement on MySQL and PostgreSQL, so concurrent writers cannot
+    both miss the row and race to insert it.
+    """
+    (key_column, key_value), = key.items()
+    row = dict(key, updated_at=datetime.utcnow(), **values)
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table).values(**row)
+        connection.execute(stmt.on_duplicate_key_update(
+            updated_at=stmt.inserted.updated_at,
+            **{name: table.c[name] + stmt.inserted[name] for name in values}
+        ))
+    elif dialect == 'postgresql':
+        stmt = postgresql.insert(table).values(**row)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[key_column],
+            set_=dict(
+                updated_at=stmt.excluded.updated_at,
+                **{name: table.c[name] + stmt.excluded[name] for name in values}
+            )
+        ))
+    else:
+        result = connection.execute(
+            table.update().where(table.c[key_column] == key_value).values(
+                updated_at=row['updated_at'],
+                **{name: table.c[name] + delta for name, delta in values.items()}
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def _bump_status_summary(connection, status, delta):
+    """Add delta to a status bucket, creating the bucket on first use"""
+    if not delta or status is None:
+        return
+    _upsert_add(connection, InventoryStatusSummary.__table__, {'status': status}, {'total_on_hand': delta})
+
+
+def _bump_counter(connection, name, delta):
+    """Add delta to a named KPI counter, creating it on first use"""
+    if not delta:
+        return
+    _upsert_add(connection, KpiCounter.__table__, {'name': name}, {'value': delta})
+
+
+# Core executemany inserts skip mapper events. Code that writes a listened-to
+# model that way calls record_bulk_insert afterwards, which runs the handlers
+# registered here with the inserted row dicts.
+_bulk_insert_listeners = {}
+
+
+def listen_bulk_insert(model, fn):
+    """Register fn(connection, rows) to run after Core bulk inserts of model"""
+    _bulk_insert_listeners.setdefault(model, []).append(fn)
+
+
+def record_bulk_insert(connection, model, rows):
+    """Run the bulk-insert handlers for rows just written to model with Core"""
+    for fn in _bulk_insert_listeners.get(model, ()):
+        fn(connection, rows)
+
+
+def _apply_balance_delta(connection, product_id, location_code, old, new):
+    """
+    Fold one InventoryBalance change into the roll-up tables.
+    old/new are (on_hand, reserved) tuples; None means the row did not exist.
+    """
+    old_on_hand, old_reserved = old or (0, 0)
+    new_on_hand, new_reserved = new or (0, 0)
+    old_low, old_zero = _balance_flags(*old) if old else (0, 0)
+    new_low, new_zero = _balance_flags(*new) if new else (0, 0)
+    
+    d_on_hand = (new_on_hand or 0) - (old_on_hand or 0)
+    d_reserved = (new_reserved or 0) - (old_reserved or 0)
+    d_products = (new is not None) - (old is not None)
+    now = datetime.utcnow()
+    
+    # Per-location roll-up; a location is active while it holds any balance
+    # rows, so active_locations moves when product_count crosses zero
+    locations = InventoryLocationSummary.__table__
+    _upsert_add(
+        connection, locations, {'location_code': location_code},
+        {'product_count': d_products, 'total_on_hand': d_on_hand, 'total_reserved': d_reserved}
+    )
+    d_locations = 0
+    if d_products:
+        product_count = connection.execute(
+            select(locations.c.product_count).where(locations.c.location_code == location_code)
+        ).scalar() or 0
+        d_locations = (product_count > 0) - (product_count - d_products > 0)
+    
+    kpi = InventoryKpiSummary.__table__
+    connection.execute(
+        kpi.update().where(kpi.c.id == 1).values(
+            total_on_hand=kpi.c.total_on_hand + d_on_hand,
+            total_reserved=kpi.c.total_reserved + d_reserved,
+            low_stock_count=kpi.c.low_stock_count + (new_low - old_low),
+            zero_stock_count=kpi.c.zero_stock_count + (new_zero - old_zero),
+            active_locations=kpi.c.active_locations + d_locations,
+            updated_at=now
+        )
+    )
+    
+    if d_on_hand:
+        status = connection.execute(
+            select(Product.status).where(Product.id == product_id)
+        ).scalar()
+        _bump_status_summary(connection, status, d_on_hand)
+
+
+def _count_product_balances(connection, product_id):
+    return connection.execute(
+        select(func.count(InventoryBalance.id)).where(InventoryBalance.product_id == product_id)
+    ).scalar()
+
+
+@event.listens_for(InventoryBalance, 'after_insert')
+def _inventory_balance_inserted(mapper, connection, target):
+    _apply_balance_delta(
+        connection, target.product_id, target.location_code,
+        None, (target.quantity_on_hand, target.quantity_reserved)
+    )
+    if _count_product_balances(connection, target.product_id) == 1:
+        _bump_counter(connection, 'stocked_products', 1)
+
+
+@event.listens_for(InventoryBalance, 'after_update')
+def _inventory_balance_updated(mapper, connection, target):
+    old = (_previous_value(target, 'quantity_on_hand'), _previous_value(target, 'quantity_reserved'))
+    new = (target.quantity_on_hand, target.quantity_reserved)
+    if old != new:
+        _apply_balance_delta(connection, target.product_id, target.location_code, old, new)
+
+
+@event.listens_for(InventoryBalance, 'after_delete')
+def _inventory_balance_deleted(mapper, connection, target):
+    _apply_balance_delta(
+        connection, target.product_id, target.location_code,
+        (target.quantity_on_hand, target.quantity_reserved), None
+    )
+    if _count_product_balances(connection, target.product_id) == 0:
+        _bump_counter(connection, 'stocked_products', -1)
+
+
+@event.listens_for(Product, 'after_update')
+def _product_status_changed(mapper, connection, target):
+    """Move a product's on-hand quantity between status buckets"""
+    old_status = _previous_value(target, 'status')
+    if old_status == target.status:
+        return
+    on_hand = connection.execute(
+        select(func.sum(InventoryBalance.quantity_on_hand)).where(
+            InventoryBalance.product_id == target.id
+        )
+    ).scalar() or 0
+    _bump_status_summary(connection, old_status, -on_hand)
+    _bump_status_summary(connection, target.status, on_hand)
+
+
+@event.listens_for(Shipment, 'after_insert')
+def _shipment_inserted(mapper, connection, target):
+    _bump_counter(connection, 'total_shipments', 1)
+
+
+@event.listens_for(Shipment, 'after_update')
+def _shipment_updated(mapper, connection, target):
+    """
+    Count deliveries when status moves to DELIVERED; a delivery is on time
+    when the shipment left by its scheduled ship date
+    """
+    old_status = _previous_value(target, 'status')
+    if target.status != ShipmentStatus.DELIVERED or old_status == ShipmentStatus.DELIVERED:
+        return
+    _bump_counter(connection, 'total_delivered', 1)
+    if (target.actual_ship_date and target.scheduled_ship_date
+            and target.actual_ship_date <= target.scheduled_ship_date):
+        _bump_counter(connection, 'on_time_count', 1)
+
+
+@event.listens_for(ShipmentLine, 'after_insert')
+def _shipment_line_inserted(mapper, connection, target):
+    _bump_counter(connection, 'total_lines', 1)
+
+
+def _shipment_lines_bulk_inserted(connection, rows):
+    _bump_counter(connection, 'total_lines', len(rows))
+
+
+listen_bulk_insert(ShipmentLine, _shipment_lines_bulk_inserted)
+
+
+@event.listens_for(InventoryTransaction, 'after_insert')
+def _inventory_transaction_inserted(mapper, connection, target):
+    if target.transaction_type in OUTBOUND_TRANSACTION_TYPES:
+        _bump_counter(connection, 'total_outbound', target.quantity)
+
+
+def _inventory_transactions_bulk_inserted(connection, rows):
+    _bump_counter(connection, 'total_outbound', sum(
+        row['quantity'] for row in rows if row['transaction_type'] in OUTBOUND_TRANSACTION_TYPES
+    ))
+
+
+listen_bulk_insert(InventoryTransaction, _inventory_transactions_bulk_inserted)
@@ -58,6 +58,7 @@ CREATE TABLE user (
     
     -- Authentication
     email VARCHAR(255) NOT NULL UNIQUE,
+    email_lower VARCHAR(255) COLLATE utf8mb4_bin GENERATED ALWAYS AS (LOWER(email)) STORED,
     password_hash VARCHAR(255) NOT NULL,
     
     -- Profile
@@ -91,6 +92,7 @@ CREATE TABLE user (
     FOREIGN KEY (organization_id) REFERENCES organization(id) ON DELETE CASCADE,
     INDEX idx_organization (organization_id),
     INDEX idx_email (email),
+    UNIQUE KEY unique_email_lower (email_lower),
     INDEX idx_active (is_active)
 ) ENGINE=InnoDB;
 
@@ -139,6 +141,7 @@ CREATE TABLE api_key (
     FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE,
     FOREIGN KEY (organization_id) REFERENCES organization(id) ON DELETE CASCADE,
     INDEX idx_key_hash (key_hash),
+    INDEX idx_prefix (prefix),
     INDEX idx_organization (organization_id)
 ) ENGINE=InnoDB;
 
@@ -185,7 +188,7 @@ CREATE TABLE product (
     FOREIGN KEY (created_by_id) REFERENCES user(id) ON DELETE SET NULL,
     FOREIGN KEY (updated_by_id) REFERENCES user(id) ON DELETE SET NULL,
     UNIQUE KEY unique_org_product_code (organization_id, product_code),
-    INDEX idx_organization (organization_id),
+    INDEX idx_org_status (organization_id, status),
     INDEX idx_status (status),
     INDEX idx_product_code (product_code)
 ) ENGINE=InnoDB;
@@ -212,7 +215,7 @@ CREATE TABLE product_revision (
     UNIQUE KEY unique_org_product_revision (organization_id, product_id, revision_number),
     INDEX idx_organization (organization_id),
     INDEX idx_status (status),
-    INDEX idx_product_id (product_id)
+    INDEX idx_product_created (product_id, created_at)
 ) ENGINE=InnoDB;
 
 -- Product change event table
@@ -259,7 +262,7 @@ CREATE TABLE bom_current (
     FOREIGN KEY (updated_by_id) REFERENCES user(id) ON DELETE SET NULL,
     UNIQUE KEY unique_bom_item (organization_id, parent_revision_id, child_product_id, position_number),
     INDEX idx_organization (organization_id),
-    INDEX idx_parent (parent_revision_id),
+    UNIQUE KEY unique_bom_position (parent_revision_id, position_number),
     INDEX idx_child (child_product_id)
 ) ENGINE=InnoDB;
 
@@ -304,7 +307,8 @@ CREATE TABLE inventory_balance (
     FOREIGN KEY (product_id) REFERENCES product(id) ON DELETE CASCADE,
     UNIQUE KEY unique_org_product_location (organization_id, product_id, location_code),
     INDEX idx_organization (organization_id),
-    INDEX idx_product (product_id),
+    INDEX idx_product_location (product_id, location_code),
+    INDEX idx_product_on_hand (product_id, quantity_on_hand),
     INDEX idx_location (location_code),
     INDEX idx_available (quantity_available)
 ) ENGINE=InnoDB;
@@ -315,7 +319,7 @@ CREATE TABLE inventory_transaction (
     organization_id BIGINT UNSIGNED NOT NULL,
     product_id BIGINT UNSIGNED NOT NULL,
     location_code VARCHAR(100) NOT NULL,
-    transaction_type ENUM('RECEIPT', 'ISSUE', 'ADJUSTMENT', 'TRANSFER_OUT', 'TRANSFER_IN', 'RESERVATION', 'RELEASE_RESERVATION') NOT NULL,
+    transaction_type ENUM('RECEIPT', 'ISSUE', 'CONSUMPTION', 'ADJUSTMENT', 'RETURN', 'TRANSFER', 'TRANSFER_OUT', 'TRANSFER_IN', 'RESERVATION', 'RELEASE_RESERVATION') NOT NULL,
     quantity DECIMAL(15,4) NOT NULL,
     unit VARCHAR(50) DEFAULT 'EA',
     reference_type VARCHAR(50),
@@ -331,7 +335,10 @@ CREATE TABLE inventory_transaction (
     FOREIGN KEY (created_by_id) REFERENCES user(id) ON DELETE SET NULL,
     INDEX idx_organization (organization_id),
     INDEX idx_product_location (product_id, location_code, created_at),
+    INDEX idx_product_created (product_id, created_at),
     INDEX idx_transaction_type (transaction_type),
+    INDEX idx_created_type (created_at, transaction_type),
+    INDEX idx_created_id (created_at, id),
     INDEX idx_reference (reference_type, reference_id)
 ) ENGINE=InnoDB;
 
@@ -357,13 +364,18 @@ CREATE TABLE shipment (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
+    -- Days from creation to shipping (NULL until shipped)
+    fulfillment_days DOUBLE GENERATED ALWAYS AS (TIMESTAMPDIFF(SECOND, created_at, actual_ship_date) / 86400) STORED,
+    
     FOREIGN KEY (organization_id) REFERENCES organization(id) ON DELETE CASCADE,
     FOREIGN KEY (created_by_id) REFERENCES user(id) ON DELETE SET NULL,
     FOREIGN KEY (updated_by_id) REFERENCES user(id) ON DELETE SET NULL,
     UNIQUE KEY unique_org_shipment_number (organization_id, shipment_number),
-    INDEX idx_organization (organization_id),
+    INDEX idx_org_status_date (organization_id, status, planned_ship_date),
     INDEX idx_status (status),
-    INDEX idx_shipment_number (shipment_number)
+    INDEX idx_shipment_number (shipment_number),
+    INDEX idx_created_status (created_at, status),
+    INDEX idx_created_id (created_at, id)
 ) ENGINE=InnoDB;
 
 -- Shipment line items (state)
@@ -384,7 +396,7 @@ CREATE TABLE shipment_line (
     FOREIGN KEY (shipment_id) REFERENCES shipment(id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES product(id) ON DELETE CASCADE,
     INDEX idx_organization (organization_id),
-    INDEX idx_shipment (shipment_id),
+    INDEX idx_shipment_product (shipment_id, product_id),
     INDEX idx_product (product_id)
 ) ENGINE=InnoDB;
 
@@ -430,7 +442,7 @@ CREATE TABLE audit_log (
     
     FOREIGN KEY (organization_id) REFERENCES organization(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE SET NULL,
-    INDEX idx_organization (organization_id),
+    INDEX idx_organization_time (organization_id, created_at),
     INDEX idx_user_time (user_id, created_at),
     INDEX idx_resource (resource_type, resource_id),
     INDEX idx_action (action)
@@ -580,6 +592,106 @@ CREATE TABLE rate_limit_counter (
     INDEX idx_window (window_start, window_end)
 ) ENGINE=InnoDB;
 
+-- ============================================================================
+-- ANALYTICS ROLL-UPS (maintained incrementally by the application)
+-- ============================================================================
+
+-- Single-row inventory KPI summary
+CREATE TABLE inventory_kpi_mv (
+    id INT PRIMARY KEY DEFAULT 1,
+    total_on_hand DECIMAL(15,4) NOT NULL DEFAULT 0,
+    total_reserved DECIMAL(15,4) NOT NULL DEFAULT 0,
+    low_stock_count INT NOT NULL DEFAULT 0,
+    zero_stock_count INT NOT NULL DEFAULT 0,
+    active_locations INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- On-hand quantity by product status; holds the application's ProductStatus
+-- names, which is what the roll-up listeners write
+CREATE TABLE inventory_status_mv (
+    status ENUM('DRAFT', 'ACTIVE', 'DEPRECATED', 'OBSOLETE') PRIMARY KEY,
+    total_on_hand DECIMAL(15,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Per-location balance summary
+CREATE TABLE inventory_location_mv (
+    location_code VARCHAR(100) PRIMARY KEY,
+    product_count INT NOT NULL DEFAULT 0,
+    total_on_hand DECIMAL(15,4) NOT NULL DEFAULT 0,
+    total_reserved DECIMAL(15,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Named running counters for performance benchmarks
+CREATE TABLE kpi_counters (
+    name VARCHAR(100) PRIMARY KEY,
+    value DECIMAL(20,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Per-shipment line totals for v_shipment_overview, maintained by the
+-- shipment_line triggers below so every write path (ORM, bulk, raw SQL)
+-- keeps them current. Lines are never moved between shipments.
+CREATE TABLE shipment_overview_mv (
+    shipment_id BIGINT UNSIGNED PRIMARY KEY,
+    line_count INT NOT NULL DEFAULT 0,
+    total_quantity_planned DECIMAL(15,4) NOT NULL DEFAULT 0,
+    total_quantity_picked DECIMAL(15,4) NOT NULL DEFAULT 0,
+    total_quantity_packed DECIMAL(15,4) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    
+    FOREIGN KEY (shipment_id) REFERENCES shipment(id) ON DELETE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TRIGGER trg_shipment_line_insert AFTER INSERT ON shipment_line
+FOR EACH ROW
+    INSERT INTO shipment_overview_mv
+        (shipment_id, line_count, total_quantity_planned, total_quantity_picked, total_quantity_packed)
+    VALUES
+        (NEW.shipment_id, 1, NEW.quantity_planned, COALESCE(NEW.quantity_picked, 0), COALESCE(NEW.quantity_packed, 0))
+    ON DUPLICATE KEY UPDATE
+        line_count = line_count + 1,
+        total_quantity_planned = total_quantity_planned + VALUES(total_quantity_planned),
+        total_quantity_picked = total_quantity_picked + VALUES(total_quantity_picked),
+        total_quantity_packed = total_quantity_packed + VALUES(total_quantity_packed);
+
+CREATE TRIGGER trg_shipment_line_update AFTER UPDATE ON shipment_line
+FOR EACH ROW
+    UPDATE shipment_overview_mv SET
+        total_quantity_planned = total_quantity_planned + NEW.quantity_planned - OLD.quantity_planned,
+        total_quantity_picked = total_quantity_picked + COALESCE(NEW.quantity_picked, 0) - COALESCE(OLD.quantity_picked, 0),
+        total_quantity_packed = total_quantity_packed + COALESCE(NEW.quantity_packed, 0) - COALESCE(OLD.quantity_packed, 0)
+    WHERE shipment_id = NEW.shipment_id;
+
+CREATE TRIGGER trg_shipment_line_delete AFTER DELETE ON shipment_line
+FOR EACH ROW
+    UPDATE shipment_overview_mv SET
+        line_count = line_count - 1,
+        total_quantity_planned = total_quantity_planned - OLD.quantity_planned,
+        total_quantity_picked = total_quantity_picked - COALESCE(OLD.quantity_picked, 0),
+        total_quantity_packed = total_quantity_packed - COALESCE(OLD.quantity_packed, 0)
+    WHERE shipment_id = OLD.shipment_id;
+
+-- Backfill lines that existed before the triggers. Totals are recomputed from
+-- shipment_line, so re-running this is safe.
+INSERT INTO shipment_overview_mv
+    (shipment_id, line_count, total_quantity_planned, total_quantity_picked, total_quantity_packed)
+SELECT
+    shipment_id,
+    COUNT(*),
+    SUM(quantity_planned),
+    SUM(COALESCE(quantity_picked, 0)),
+    SUM(COALESCE(quantity_packed, 0))
+FROM shipment_line
+GROUP BY shipment_id
+ON DUPLICATE KEY UPDATE
+    line_count = VALUES(line_count),
+    total_quantity_planned = VALUES(total_quantity_planned),
+    total_quantity_picked = VALUES(total_quantity_picked),
+    total_quantity_packed = VALUES(total_quantity_packed);
+
 -- ============================================================================
 -- ANALYTICS VIEWS (Organization-scoped)
 -- ============================================================================
@@ -621,6 +733,8 @@ INNER JOIN product cp ON bc.child_product_id = cp.id
 ORDER BY pr.organization_id, pr.id, bc.position_number;
 
 -- Shipment status overview (organization-scoped)
+-- Line totals come from shipment_overview_mv; with no GROUP BY the view is
+-- merged into the caller's query, so the organization filter uses an index
 CREATE OR REPLACE VIEW v_shipment_overview AS
 SELECT 
     s.organization_id,
@@ -633,17 +747,14 @@ SELECT
     s.tracking_number,
     s.planned_ship_date,
     s.actual_ship_date,
-    COUNT(sl.id) AS line_count,
-    SUM(sl.quantity_planned) AS total_quantity_planned,
-    SUM(sl.quantity_picked) AS total_quantity_picked,
-    SUM(sl.quantity_packed) AS total_quantity_packed,
+    COALESCE(so.line_count, 0) AS line_count,
+    COALESCE(so.total_quantity_planned, 0) AS total_quantity_planned,
+    COALESCE(so.total_quantity_picked, 0) AS total_quantity_picked,
+    COALESCE(so.total_quantity_packed, 0) AS total_quantity_packed,
     s.created_at,
     s.updated_at
 FROM shipment s
-LEFT JOIN shipment_line sl ON s.id = sl.shipment_id
-GROUP BY s.organization_id, s.id, s.shipment_number, s.status, s.from_location, s.to_location, 
-         s.carrier, s.tracking_number, s.planned_ship_date, s.actual_ship_date,
-         s.created_at, s.updated_at;
+LEFT JOIN shipment_overview_mv so ON so.shipment_id = s.id;
 
 -- Recent inventory activity (organization-scoped)
 CREATE OR REPLACE VIEW v_recent_inventory_activity AS
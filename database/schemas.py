@@ -13,35 +13,33 @@ from enum import Enum
 # Enums (matching database)
 # ============================================================================
 
-class ProductStatusEnum(str, Enum):
-    ACTIVE = "ACTIVE"
-    OBSOLETE = "OBSOLETE"
-    DEVELOPMENT = "DEVELOPMENT"
+class _CaseInsensitiveEnum(str, Enum):
+    """String enum that also accepts its values in any letter case"""
     
     @classmethod
     def _missing_(cls, value):
-        """Allow case-insensitive enum matching"""
+        """Allow case-insensitive enum matching via a per-class lookup built on first use"""
         if isinstance(value, str):
-            for member in cls:
-                if member.value.upper() == value.upper():
-                    return member
+            index = cls.__dict__.get("_upper_index")
+            if index is None:
+                index = {member.value.upper(): member for member in cls}
+                cls._upper_index = index
+            member = index.get(value.upper())
+            if member is not None:
+                return member
         return super()._missing_(value)
 
-class RevisionStatusEnum(str, Enum):
+class ProductStatusEnum(_CaseInsensitiveEnum):
+    ACTIVE = "ACTIVE"
+    OBSOLETE = "OBSOLETE"
+    DEVELOPMENT = "DEVELOPMENT"
+
+class RevisionStatusEnum(_CaseInsensitiveEnum):
     DRAFT = "DRAFT"
     RELEASED = "RELEASED"
     OBSOLETE = "OBSOLETE"
-    
-    @classmethod
-    def _missing_(cls, value):
-        """Allow case-insensitive enum matching"""
-        if isinstance(value, str):
-            for member in cls:
-                if member.value.upper() == value.upper():
-                    return member
-        return super()._missing_(value)
 
-class TransactionTypeEnum(str, Enum):
+class TransactionTypeEnum(_CaseInsensitiveEnum):
     RECEIPT = "RECEIPT"
     ISSUE = "ISSUE"
     ADJUSTMENT = "ADJUSTMENT"
@@ -49,17 +47,8 @@ class TransactionTypeEnum(str, Enum):
     TRANSFER_IN = "TRANSFER_IN"
     RESERVATION = "RESERVATION"
     RELEASE_RESERVATION = "RELEASE_RESERVATION"
-    
-    @classmethod
-    def _missing_(cls, value):
-        """Allow case-insensitive enum matching"""
-        if isinstance(value, str):
-            for member in cls:
-                if member.value.upper() == value.upper():
-                    return member
-        return super()._missing_(value)
 
-class ShipmentStatusEnum(str, Enum):
+class ShipmentStatusEnum(_CaseInsensitiveEnum):
     DRAFT = "DRAFT"
     CONFIRMED = "CONFIRMED"
     PICKED = "PICKED"
@@ -67,15 +56,6 @@ class ShipmentStatusEnum(str, Enum):
     SHIPPED = "SHIPPED"
     DELIVERED = "DELIVERED"
     CANCELLED = "CANCELLED"
-    
-    @classmethod
-    def _missing_(cls, value):
-        """Allow case-insensitive enum matching"""
-        if isinstance(value, str):
-            for member in cls:
-                if member.value.upper() == value.upper():
-                    return member
-        return super()._missing_(value)
 
 # ============================================================================
 # PLM Schemas
@@ -7,20 +7,24 @@ from fastapi import FastAPI, Depends, HTTPException, status, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session, raiseload
 from typing import Optional, List
 from datetime import datetime
+import math
 import os
 
 # Core imports
-from backend.database import get_db, check_db_connection
+from backend.database import get_db, get_db_context, check_db_connection, HAS_ORJSON
 
 # Services
-from backend.auth_service import AuthService, OrganizationService
+from backend.auth_service import AuthService, OrganizationService, flush_audit_queue
 from backend.plm_service import PLMService
 from backend.logistics_service import LogisticsService
 from backend.analytics_service import AnalyticsService
+from backend.rate_limit_service import RateLimitService, RATE_LIMIT_ENABLED, rate_limit_key
 
 # Models
 from database.saas_models_py37 import User, Organization, UserRole, AuditLog, AuditAction
@@ -37,9 +41,36 @@ app = FastAPI(
     description="Enterprise Supply Chain Intelligence Platform",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # Encode response bodies with orjson when it is installed
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse
 )
 
+# Rate limiting (opt-in via RATE_LIMIT_ENABLED); runs before routing, so the
+# caller is identified from the bearer token's signed claims. Registered
+# before CORS so 429 responses still carry the CORS headers
+@app.middleware("http")
+async def rate_limit_middleware(request: Request, call_next):
+    """Reject API requests with 429 once the caller's bucket is empty"""
+    if RATE_LIMIT_ENABLED and request.url.path.startswith("/api/"):
+        claims = None
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            claims = AuthService.peek_access_claims(authorization[7:])
+        key = rate_limit_key(
+            claims.get("org_id") if claims else None,
+            claims.get("sub") if claims else None,
+            request.client.host
+        )
+        decision = await run_in_threadpool(RateLimitService.hit, key)
+        if not decision.allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(math.ceil(decision.retry_after), 1))}
+            )
+    return await call_next(request)
+
 # CORS Configuration
 app.add_middleware(
     CORSMiddleware,
@@ -96,9 +127,9 @@ def check_permission(resource: str, action: str):
 # ============================================================================
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+def health_check():
     """Health check endpoint"""
-    db_connected = check_db_connection(db)
+    db_connected = check_db_connection()
     return {
         "status": "healthy" if db_connected else "unhealthy",
         "database": "connected" if db_connected else "disconnected",
@@ -178,12 +209,13 @@ def login(
 
 @app.post("/api/auth/logout")
 def logout(
+    refresh_token: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ):
-    """Logout user and revoke session"""
-    AuthService.logout(db, credentials.credentials)
+    """Logout user and revoke session (and the refresh token, when passed)"""
+    AuthService.logout(db, credentials.credentials, refresh_token)
     return {"message": "Logged out successfully"}
 
 @app.get("/api/auth/me")
@@ -253,9 +285,16 @@ def list_users(
     db: Session = Depends(get_db)
 ):
     """List users in organization"""
-    users = db.query(User).filter(
-        User.organization_id == current_user.organization_id
-    ).offset(skip).limit(limit).all()
+    # Only the serialized columns, as plain rows; no User objects are built
+    users = db.execute(
+        select(
+            User.id, User.email,
+            (User.first_name + " " + User.last_name).label("full_name"),
+            User.role, User.is_active, User.last_login_at
+        ).where(
+            User.organization_id == current_user.organization_id
+        ).offset(skip).limit(limit)
+    ).all()
     
     return [
         {
@@ -560,7 +599,6 @@ def create_shipment(
         db.add(db_line)
     
     db.commit()
-    db.refresh(db_shipment)
     
     return db_shipment
 
@@ -573,7 +611,8 @@ def list_shipments(
     """List shipments"""
     from models import Shipment, ShipmentStatus
     
-    query = db.query(Shipment).filter(
+    # Only shipment columns are returned; raise rather than lazy-load per row
+    query = db.query(Shipment).options(raiseload("*")).filter(
         Shipment.organization_id == current_user.organization_id
     )
     
@@ -814,7 +853,7 @@ def get_bom_complexity(
     db: Session = Depends(get_db)
 ):
     """Get BOM complexity analysis"""
-    return AnalyticsService.get_bom_complexity_analysis(db)
+    return Response(AnalyticsService.get_bom_complexity_analysis(db, as_json=True), media_type="application/json")
 
 @app.get("/api/analytics/abc-analysis")
 def get_abc_analysis(
@@ -830,7 +869,7 @@ def get_location_utilization(
     db: Session = Depends(get_db)
 ):
     """Get warehouse location utilization metrics"""
-    return AnalyticsService.get_location_utilization(db)
+    return Response(AnalyticsService.get_location_utilization(db, as_json=True), media_type="application/json")
 
 # ============================================================================
 # Organization Endpoints
@@ -876,7 +915,6 @@ def update_organization(
         org.phone = phone
     
     db.commit()
-    db.refresh(org)
     
     return {"message": "Organization updated successfully"}
 
@@ -931,6 +969,8 @@ def list_audit_logs(
 async def startup_event():
     """Run on application startup"""
     print("CDE SaaS Platform starting...")
+    with get_db_context() as db:
+        AnalyticsService.seed_rollups(db)
     print("Database: Connected")
     print("Authentication: Enabled")
     print("Multi-Tenancy: Active")
@@ -968,6 +1008,7 @@ async def analytics():
 async def shutdown_event():
     """Run on application shutdown"""
     print("CDE SaaS Platform shutting down...")
+    flush_audit_queue()
 
 # ============================================================================
 # Run Application
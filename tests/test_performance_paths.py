@@ -0,0 +1,401 @@
+"""
+CDE SaaS - Roll-up, Caching, Pagination, Rate Limit and Auth Tests
+Runs the services in-process against an in-memory SQLite database
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Keep the services off any configured MySQL/Redis; must precede backend imports
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ.pop("REDIS_URL", None)
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, create_engine, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.saas_models_py37 import (
+    Base, Organization, User, UserRole, ApiKey, Product, ProductStatus,
+    InventoryBalance, InventoryTransaction, TransactionType,
+    InventoryKpiSummary, InventoryLocationSummary, InventoryStatusSummary
+)
+from database.saas_models_py37 import record_bulk_insert
+from backend import analytics_service, auth_service
+from backend.analytics_service import cached_result, invalidate_analytics_cache
+from backend.auth_service import AuthService, _hash_api_key, API_KEY_PREFIX_LENGTH
+from backend.logistics_service import LogisticsService
+from backend.plm_service import PLMService
+from backend.rate_limit_service import RateLimitService, _hit_local, rate_limit_key
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_sqlite(element, compiler, **kw):
+    # SQLite only autoincrements INTEGER PRIMARY KEY columns
+    return "INTEGER"
+
+
+engine = create_engine(
+    "sqlite://",
+    poolclass=StaticPool,
+    connect_args={"check_same_thread": False}
+)
+TestSession = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+
+def print_section(title):
+    print(f"\n{'='*60}")
+    print(f"  {title}")
+    print(f"{'='*60}\n")
+
+
+def fresh_session():
+    """Empty schema and a new session on it"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return TestSession()
+
+
+def add_product(db, code, status=ProductStatus.ACTIVE):
+    product = Product(organization_id=1, product_code=code, name=code, status=status)
+    db.add(product)
+    db.commit()
+    return product
+
+
+def kpi_row(db):
+    kpi = InventoryKpiSummary.__table__
+    return db.execute(select(kpi).where(kpi.c.id == 1)).one()
+
+
+def location_row(db, location_code):
+    locations = InventoryLocationSummary.__table__
+    return db.execute(select(locations).where(locations.c.location_code == location_code)).one()
+
+
+def status_total(db, status):
+    statuses = InventoryStatusSummary.__table__
+    return db.execute(
+        select(statuses.c.total_on_hand).where(statuses.c.status == status)
+    ).scalar()
+
+
+# ============================================================================
+# Inventory Roll-ups
+# ============================================================================
+
+def test_balance_rollups():
+    print_section("1. InventoryBalance Roll-up Deltas")
+    db = fresh_session()
+    try:
+        db.add(InventoryKpiSummary(id=1))
+        db.commit()
+        widget = add_product(db, "WIDGET")
+        gadget = add_product(db, "GADGET")
+        
+        # Insert
+        widget_balance = InventoryBalance(
+            product_id=widget.id, location_code="WH-01", quantity_on_hand=100, quantity_reserved=0
+        )
+        db.add(widget_balance)
+        db.commit()
+        
+        kpi = kpi_row(db)
+        assert kpi.total_on_hand == 100 and kpi.total_reserved == 0
+        assert kpi.low_stock_count == 0 and kpi.zero_stock_count == 0
+        assert kpi.active_locations == 1
+        location = location_row(db, "WH-01")
+        assert location.product_count == 1 and location.total_on_hand == 100
+        assert status_total(db, ProductStatus.ACTIVE) == 100
+        print("✓ Insert adds on-hand and opens the location")
+        
+        # Update into low stock
+        widget_balance.quantity_on_hand = 5
+        widget_balance.quantity_reserved = 2
+        db.commit()
+        
+        kpi = kpi_row(db)
+        assert kpi.total_on_hand == 5 and kpi.total_reserved == 2
+        assert kpi.low_stock_count == 1 and kpi.zero_stock_count == 0
+        assert kpi.active_locations == 1
+        location = location_row(db, "WH-01")
+        assert location.total_on_hand == 5 and location.total_reserved == 2
+        assert status_total(db, ProductStatus.ACTIVE) == 5
+        print("✓ Update applies the delta and flags low stock")
+        
+        # Second product at the same location, empty
+        gadget_balance = InventoryBalance(
+            product_id=gadget.id, location_code="WH-01", quantity_on_hand=0, quantity_reserved=0
+        )
+        db.add(gadget_balance)
+        db.commit()
+        
+        kpi = kpi_row(db)
+        assert kpi.low_stock_count == 2 and kpi.zero_stock_count == 1
+        assert kpi.active_locations == 1
+        assert location_row(db, "WH-01").product_count == 2
+        print("✓ Second balance at a location leaves active_locations alone")
+        
+        # Delete both
+        db.delete(widget_balance)
+        db.commit()
+        assert kpi_row(db).active_locations == 1
+        db.delete(gadget_balance)
+        db.commit()
+        
+        kpi = kpi_row(db)
+        assert kpi.total_on_hand == 0 and kpi.total_reserved == 0
+        assert kpi.low_stock_count == 0 and kpi.zero_stock_count == 0
+        assert kpi.active_locations == 0
+        location = location_row(db, "WH-01")
+        assert location.product_count == 0 and location.total_on_hand == 0
+        assert status_total(db, ProductStatus.ACTIVE) == 0
+        print("✓ Deleting the last balance closes the location")
+    finally:
+        db.close()
+
+
+# ============================================================================
+# Analytics Cache
+# ============================================================================
+
+def test_cached_result_invalidation():
+    print_section("2. cached_result Invalidation")
+    db = fresh_session()
+    calls = []
+    
+    @cached_result
+    def count_products(db):
+        calls.append(1)
+        return db.query(Product).count()
+    
+    try:
+        invalidate_analytics_cache()
+        assert count_products(db) == 0
+        assert count_products(db) == 0
+        assert len(calls) == 1
+        print("✓ Repeat call is served from the cache")
+        
+        version = analytics_service._data_version
+        add_product(db, "CACHED")
+        assert analytics_service._data_version > version
+        assert count_products(db) == 1
+        assert len(calls) == 2
+        print("✓ ORM write bumps the data version and recomputes")
+        
+        version = analytics_service._data_version
+        record_bulk_insert(db.connection(), Product, [])
+        assert analytics_service._data_version > version
+        count_products(db)
+        assert len(calls) == 3
+        print("✓ Core bulk insert bumps the data version")
+        
+        invalidate_analytics_cache()
+        count_products(db)
+        assert len(calls) == 4
+        print("✓ invalidate_analytics_cache drops cached results")
+    finally:
+        db.close()
+
+
+# ============================================================================
+# Keyset Pagination
+# ============================================================================
+
+def test_keyset_pagination():
+    print_section("3. Keyset Pagination Boundaries")
+    db = fresh_session()
+    try:
+        products = [add_product(db, "P-{:02d}".format(n)) for n in range(5)]
+        
+        # Ties on created_at must be broken by id, never skipped or repeated
+        base = datetime(2024, 1, 1, 12, 0, 0)
+        for n in range(7):
+            db.add(InventoryTransaction(
+                product_id=products[0].id,
+                transaction_type=TransactionType.RECEIPT,
+                location_code="WH-01",
+                quantity=1,
+                created_at=base + timedelta(seconds=n // 3)
+            ))
+        db.commit()
+        
+        expected = [
+            t.id for t in db.query(InventoryTransaction).order_by(
+                InventoryTransaction.created_at.desc(), InventoryTransaction.id.desc()
+            )
+        ]
+        seen = []
+        page = LogisticsService.get_transactions(db, limit=2)
+        while page:
+            seen.extend(t.id for t in page)
+            last = page[-1]
+            page = LogisticsService.get_transactions(
+                db, after_created_at=last.created_at, after_id=last.id, limit=2
+            )
+        assert seen == expected
+        print("✓ Transaction pages cover every row once across created_at ties")
+        
+        seen = []
+        page = PLMService.list_products(db, limit=2)
+        while page:
+            seen.extend(p.id for p in page)
+            page = PLMService.list_products(db, after_id=page[-1].id, limit=2)
+        assert seen == sorted(p.id for p in products)
+        assert PLMService.list_products(db, after_id=products[-1].id) == []
+        print("✓ Product pages end cleanly after the last id")
+    finally:
+        db.close()
+
+
+# ============================================================================
+# Rate Limiting
+# ============================================================================
+
+def test_token_bucket():
+    print_section("4. Token Bucket")
+    assert rate_limit_key(7, 42, "10.0.0.1") == "rl:7:42"
+    assert rate_limit_key(None, None, "10.0.0.1") == "rl:anon:10.0.0.1"
+    print("✓ Keys are scoped by organization, then user or IP")
+    
+    key = "rl:test:{}".format(time.monotonic())
+    decisions = [_hit_local(key, 1, 3, 20.0) for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert decisions[-1].retry_after > 0
+    print("✓ Capacity is spent, then requests are refused with Retry-After")
+    
+    assert _hit_local(key + ":other", 1, 3, 20.0).allowed
+    print("✓ Buckets are independent per key")
+    
+    time.sleep(0.1)
+    assert _hit_local(key, 1, 3, 20.0).allowed
+    print("✓ Tokens refill over time")
+    
+    # No Redis and no MySQL/PostgreSQL counter: falls back to this process
+    key = "rl:test:{}".format(time.monotonic())
+    assert RateLimitService.hit(key, capacity=1, rate=0.01).allowed
+    assert not RateLimitService.hit(key, capacity=1, rate=0.01).allowed
+    print("✓ RateLimitService.hit falls back to the in-process bucket")
+
+
+# ============================================================================
+# Authentication
+# ============================================================================
+
+def test_jti_revocation():
+    print_section("5. Token Revocation")
+    user = SimpleNamespace(id=1, email="user@example.com", organization_id=1, role=UserRole.USER)
+    other = SimpleNamespace(id=2, email="other@example.com", organization_id=1, role=UserRole.USER)
+    access_token = AuthService._create_access_token(user)
+    refresh_token = AuthService._create_refresh_token(user)
+    other_refresh = AuthService._create_refresh_token(other)
+    
+    enqueue_audit = auth_service.enqueue_audit
+    auth_service.enqueue_audit = lambda **kwargs: None
+    try:
+        assert AuthService.verify_token(access_token)["sub"] == "1"
+        try:
+            AuthService.get_current_user(None, refresh_token)
+            assert False, "refresh token accepted as access token"
+        except HTTPException as e:
+            assert e.status_code == 401 and e.detail == "Invalid token type"
+        print("✓ Refresh tokens cannot authenticate requests")
+        
+        AuthService.logout(None, access_token, refresh_token)
+        # A second session of the same user cannot revoke someone else's token
+        AuthService.logout(None, AuthService._create_access_token(user), other_refresh)
+        for token in (access_token, refresh_token):
+            try:
+                AuthService.verify_token(token)
+                assert False, "revoked token accepted"
+            except HTTPException as e:
+                assert e.status_code == 401 and e.detail == "Token revoked"
+        print("✓ Logout revokes the access token and its refresh token")
+        
+        assert AuthService.verify_token(other_refresh)["sub"] == "2"
+        print("✓ Another user's refresh token is not revoked")
+    finally:
+        auth_service.enqueue_audit = enqueue_audit
+
+
+def test_api_key_lookup():
+    print_section("6. API Key Prefix Lookup")
+    db = fresh_session()
+    try:
+        organization = Organization(slug="acme", name="Acme")
+        db.add(organization)
+        db.flush()
+        user = User(
+            organization_id=organization.id, email="keys@example.com", password_hash="x",
+            first_name="Key", last_name="Owner"
+        )
+        db.add(user)
+        db.flush()
+        
+        raw_key = "sk_test_legacy0123456789abcdefghijklmnop"
+        legacy_hash = hashlib.sha256(raw_key.encode()).hexdigest()
+        api_key = ApiKey(
+            user_id=user.id, organization_id=organization.id, name="legacy",
+            key_hash=legacy_hash, prefix=raw_key[:API_KEY_PREFIX_LENGTH]
+        )
+        db.add(api_key)
+        db.commit()
+        
+        found_user, found_key = AuthService.verify_api_key(db, raw_key)
+        assert found_user.id == user.id and found_key.id == api_key.id
+        stored = db.execute(select(ApiKey.key_hash).where(ApiKey.id == api_key.id)).scalar()
+        assert stored == _hash_api_key(raw_key) != legacy_hash
+        print("✓ Legacy SHA-256 key verifies and is rehashed")
+        
+        _, found_key = AuthService.verify_api_key(db, raw_key)
+        assert found_key.id == api_key.id
+        print("✓ Rehashed key verifies on the keyed hash")
+        
+        # Same prefix, different secret
+        try:
+            AuthService.verify_api_key(db, raw_key[:API_KEY_PREFIX_LENGTH] + "wrong")
+            assert False, "wrong key accepted"
+        except HTTPException as e:
+            assert e.status_code == 401
+        
+        api_key.revoked_at = datetime.utcnow()
+        db.commit()
+        try:
+            AuthService.verify_api_key(db, raw_key)
+            assert False, "revoked key accepted"
+        except HTTPException as e:
+            assert e.status_code == 401
+        print("✓ Wrong and revoked keys are refused")
+    finally:
+        db.close()
+
+
+def run_all_tests():
+    """Run the in-process performance path tests"""
+    print("\n" + "="*60)
+    print("  CDE SaaS - Performance Path Tests")
+    print("  Roll-ups + Cache + Pagination + Rate Limits + Auth")
+    print("="*60)
+    
+    try:
+        test_balance_rollups()
+        test_cached_result_invalidation()
+        test_keyset_pagination()
+        test_token_bucket()
+        test_jti_revocation()
+        test_api_key_lookup()
+        
+        print_section("Test Suite Complete")
+        print("✓ All checks passed!")
+    
+    except Exception as e:
+        print(f"\n✗ Test failed with error: {e}")
+        import traceback
+        traceback.print_exc()
+
+if __name__ == "__main__":
+    run_all_tests()